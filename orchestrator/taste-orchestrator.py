@@ -11,16 +11,30 @@ the build process, invoking all necessary tools and code generators
 #
 import sys
 import os
+import errno
 import shutil
 import getopt
 import re
+import shlex
 import hashlib
 import traceback
 import subprocess
 import copy
 import time
+import math
 import glob
 import logging
+import tempfile
+import cPickle
+import sqlite3
+import zipfile
+import zlib
+import json
+import resource
+import fcntl
+import filecmp
+import fnmatch
+import collections
 import multiprocessing
 import xml.sax.saxutils
 
@@ -85,6 +99,75 @@ g_currentStage = ""
 # Python logging handler, to report build stages for Peter
 g_stageLog = None
 
+# The file descriptor that the trace events (of the build stages and of the
+# commands, see TraceEvent) are appended to - by us and by our forked jobs
+g_traceFd = None
+
+# When (and in which process) the trace was started
+g_traceStart = 0.0
+g_tracePid = 0
+
+# Maximum number of jobs (build stages, compilations, ...) that are allowed
+# to run at the same time - set from the "--jobs" command line argument
+g_maxJobs = 1
+
+# Exit status and resource usage of children that were reaped while waiting
+# for some other child, e.g. { 1234 : (0, resource.struct_rusage(...)) }
+g_reapedChildren = {}
+
+# Flag controlling whether the partitions are built concurrently
+g_bParallelPartitions = False
+
+# The (read, write) file descriptors of the GNU make jobserver pipe. Every
+# process of the build - the jobs of our JobPools as well as the makes we
+# spawn - must hold a token from it to run, so that at most g_maxJobs of
+# them run at any time (closes the N*N oversubscription of nested pools)
+g_jobServer = None
+
+# Memory budget (in MB) of the jobs running at the same time - set from the
+# "--memory-budget" command line argument (0 means no limit)
+g_memoryBudget = 0
+
+# Peak RSS (in MB) of each job in earlier runs (measured via wait4), with
+# the jobs named after the kind of their JobPool and their key, e.g.
+# { 'cc /path/to/output/mysub/mysub:a.c' : 1210 }
+g_jobMemoryEstimates = {}
+
+
+# The memory (in MB) reserved by all running jobs - shared across all forked
+# processes - and the memory reserved for the job that we are running in
+g_memoryInUse = None
+g_memoryOfThisJob = 0
+
+# Maximum size (in MB) of the object cache - set from the "--cache-size"
+# command line argument (0 disables the cache)
+g_cacheSize = 1024
+
+# The folder of the object cache - set from the "--cache-dir" command line
+# argument, or the TASTE_CACHE_DIR env var (by default, it is kept in the
+# output folder). It can be shared by all the builds on a host (e.g. on NFS).
+g_cacheDir = os.path.abspath(os.getenv("TASTE_CACHE_DIR")) if os.getenv("TASTE_CACHE_DIR") else ""
+
+# The cache of compiled objects and generated code (a ContentCache) - e.g.
+# objects are keyed by the compiler, the CFLAGS and the preprocessed source
+g_objectCache = None
+
+# The state kept across builds (a BuildStateStore in the output folder)
+g_buildState = None
+
+# The MD5 hashes of the files, along with the FileStatKey they were computed
+# for and the time they were computed at, e.g.
+# { '/path/to/DataView.asn' : ('1234 1546300800000000000 5678', 'd41d8...', 1546300900.5) }
+g_fileHashes = {}
+
+# The answers of QueryTool, along with the mtime and size of the tool that gave
+# them, e.g. { '/usr/bin/taste-config --prefix' : ('1546300800000000000 1234', '/usr') }
+g_toolAnswers = {}
+
+# Compiler flags that produce more than just the object file - compilations
+# using them can't be served from the object cache
+g_uncacheableFlags = re.compile(r'(^|\s)(-M|-save-temps|-ftest-coverage|-fprofile-arcs|-fprofile-generate|--coverage)')
+
 
 class ColorFormatter(logging.Formatter):
     # FORMAT = ("[%(levelname)-19s]  " "$BOLD%(filename)-20s$RESET" "%(message)s")
@@ -136,31 +219,187 @@ def panic(x):
         x += "\n"
     sys.stderr.write(x)
     g_stageLog.error(g_currentStage)
-    if g_absOutputDir != "":
-        os.system('env > "' + g_absOutputDir + os.sep + 'env.txt"')
+    SaveEnvironment()
+    FinishTrace()
     sys.exit(1)
 
 
-def mysystem(x, outputDir=None):
-    '''Spawns a cmd, logs it, and if it failed, will optionally retry it when ENTER is pressed'''
+def SaveEnvironment(env=None):
+    '''Saves the environment (by default, ours) under OUTPUT_FOLDER/env.txt'''
+    if g_absOutputDir != "":
+        f = open(g_absOutputDir + os.sep + 'env.txt', 'w')
+        for key, value in sorted((env if env is not None else os.environ).items()):
+            f.write("%s=%s\n" % (key, value))
+        f.close()
+
+
+# The CPU times (in seconds) and peak RSS (in KB) of a stage or command, as in resource.struct_rusage
+Rusage = collections.namedtuple('Rusage', ['ru_utime', 'ru_stime', 'ru_maxrss'])
+
+
+def StartTrace(outputDir):
+    '''Starts recording the trace events of the build in OUTPUT_FOLDER/trace.events'''
+    global g_traceFd, g_traceStart, g_tracePid
+    g_traceFd = os.open(outputDir + os.sep + "trace.events", os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_APPEND, 0644)
+    g_traceStart = time.time()
+    g_tracePid = os.getpid()
+
+
+def TraceEvent(name, category, startTime, wallTime, rusage=None, args=None):
+    '''Records a stage or a command that started at startTime and took wallTime seconds
+
+    The rusage (from wait4, or a Rusage) adds its user/sys CPU times and peak RSS.
+    Each event is one line, written with a single (O_APPEND) write - so the
+    events of concurrent jobs don't get mixed up.'''
+    if g_traceFd is None:
+        return
+    args = dict(args or {})
+    if rusage is not None:
+        args["user"] = round(rusage.ru_utime, 3)
+        args["sys"] = round(rusage.ru_stime, 3)
+        args["maxRSS_MB"] = rusage.ru_maxrss / 1024
+    event = {
+        "name": name, "cat": category, "ph": "X",
+        "ts": int((startTime - g_traceStart) * 1000000), "dur": int(wallTime * 1000000),
+        "pid": g_tracePid, "tid": os.getpid(), "args": args}
+    os.write(g_traceFd, json.dumps(event) + "\n")
+
+
+def RusageSince(before):
+    '''The CPU times that we (and our reaped children) spent since the (self, children) getrusage pair before'''
+    after = (resource.getrusage(resource.RUSAGE_SELF), resource.getrusage(resource.RUSAGE_CHILDREN))
+    return Rusage(
+        sum(a.ru_utime - b.ru_utime for a, b in zip(after, before)),
+        sum(a.ru_stime - b.ru_stime for a, b in zip(after, before)),
+        max(a.ru_maxrss for a in after))
+
+
+def FinishTrace():
+    '''Turns the trace events into OUTPUT_FOLDER/trace.json (for chrome://tracing) and OUTPUT_FOLDER/timings.txt
+
+    The latter has a table with the stages, and one with the commands (grouped by tool).'''
+    global g_traceFd
+    if g_traceFd is None or os.getpid() != g_tracePid:
+        return
+    TraceEvent("Build", "build", g_traceStart, time.time() - g_traceStart,
+               RusageSince((Rusage(0.0, 0.0, 0), Rusage(0.0, 0.0, 0))))
+    os.close(g_traceFd)
+    g_traceFd = None
+    events = []
+    for line in open(g_absOutputDir + os.sep + "trace.events"):
+        try:
+            events.append(json.loads(line))
+        except ValueError:
+            # e.g. the half-written event of a job that was killed
+            pass
+    events.sort(key=lambda e: e["ts"])
+    f = open(g_absOutputDir + os.sep + "trace.json", "w")
+    json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+    f.close()
+    os.unlink(g_absOutputDir + os.sep + "trace.events")
+
+    row = "%-40s %8s %10s %10s %10s %12s\n"
+    f = open(g_absOutputDir + os.sep + "timings.txt", "w")
+    f.write(row % ("Stage", "", "Wall (s)", "User (s)", "Sys (s)", "Max RSS (MB)"))
+    for e in events:
+        if e["cat"] in ("stage", "build"):
+            a = e["args"]
+            f.write(row % (e["name"], "", "%.2f" % (e["dur"] / 1e6), "%.2f" % a.get("user", 0),
+                           "%.2f" % a.get("sys", 0), a.get("maxRSS_MB", "")))
+    tools = {}
+    for e in events:
+        if e["cat"] == "cmd":
+            argv = SplitCommand(e["name"]) or e["name"].split() or ["?"]
+            tool = tools.setdefault(os.path.basename(argv[0]), [0, 0, 0.0, 0.0, 0])
+            tool[0] += 1
+            tool[1] += e["dur"]
+            tool[2] += e["args"].get("user", 0)
+            tool[3] += e["args"].get("sys", 0)
+            tool[4] = max(tool[4], e["args"].get("maxRSS_MB", 0))
+    f.write("\n" + row % ("Command", "Count", "Wall (s)", "User (s)", "Sys (s)", "Max RSS (MB)"))
+    for name, (count, dur, user, system, maxRSS) in sorted(tools.items(), key=lambda t: -t[1][1]):
+        f.write(row % (name, count, "%.2f" % (dur / 1e6), "%.2f" % user, "%.2f" % system, maxRSS))
+    f.close()
+
+
+# Commands with any of these are run via /bin/sh - the others are spawned directly
+g_shellFeatures = re.compile(r'[|&;<>()$`\\*?\[\]{}~#!\n]')
+g_shellBuiltins = set(["cd", "exit", "export", "source", ".", "set", "unset", "ulimit", "umask",
+                       "alias", "eval", "exec", "read", "shift", "trap", "wait", "type", "command"])
+
+
+def SplitCommand(cmd):
+    '''Returns the argv of a command that uses no shell features (pipes, redirections, variables,
+    globs, etc) - or None if it needs a shell'''
+    if g_shellFeatures.search(cmd):
+        return None
+    try:
+        argv = shlex.split(cmd)
+    except ValueError:
+        return None
+    if not argv or '=' in argv[0] or argv[0] in g_shellBuiltins:
+        return None
+    return argv
+
+
+def RunCommand(cmd, cwd=None, env=None):
+    '''Runs a command (directly, if it needs no shell) and returns its (exit status, wall time, rusage)'''
+    argv = SplitCommand(cmd)
+    start = time.time()
+    try:
+        if argv is None:
+            p = subprocess.Popen(cmd, shell=True, cwd=cwd, env=env)
+        else:
+            p = subprocess.Popen(argv, cwd=cwd, env=env)
+    except OSError as e:
+        # The same as what the shell would report
+        sys.stderr.write("%s: %s\n" % (argv[0] if argv else cmd, e.strerror))
+        return 127, time.time() - start, None
+    while True:
+        try:
+            _, status, rusage = os.wait4(p.pid, 0)
+            break
+        except OSError as e:
+            if e.errno != errno.EINTR:
+                raise
+    p.returncode = status
+    if os.WIFSIGNALED(status):
+        return 128 + os.WTERMSIG(status), time.time() - start, rusage
+    return os.WEXITSTATUS(status), time.time() - start, rusage
+
+
+def mysystem(x, outputDir=None, cwd=None, env=None):
+    '''Spawns a cmd, logs it, and if it failed, will optionally retry it when ENTER is pressed
+
+    The cmd runs in cwd and with env, if given (instead of ours). Its exit
+    status, wall time and CPU time are also recorded in the log.'''
     global g_log
     if g_log is None:
         g_log = open(outputDir + os.sep + "log.txt", "w")
         return
-    g_log.write("From: " + os.getcwd() + "\n")
+    g_log.write("From: " + (cwd or os.getcwd()) + "\n")
     g_log.write(x + "\n")
     g_log.flush()
-    while os.system(x) != 0:
+    while True:
+        startTime = time.time()
+        status, wallTime, rusage = RunCommand(x, cwd, env)
+        TraceEvent(x, "cmd", startTime, wallTime, rusage, {"cwd": cwd or os.getcwd(), "status": status})
+        cpuTime = rusage.ru_utime + rusage.ru_stime if rusage is not None else 0.0
+        # (concurrent jobs share the log - so say which cmd this was about)
+        g_log.write("(exit status %d, %.2fs, %.2fs CPU: %s)\n" % (
+            status, wallTime, cpuTime, x if len(x) <= 60 else x[:57] + "..."))
+        g_log.flush()
+        if status == 0:
+            break
         # Save the environment that was used for the failed command under OUTPUT_FOLDER/env.txt
-        if g_absOutputDir != "":
-            os.system('env > "' + g_absOutputDir + os.sep + 'env.txt"')
+        SaveEnvironment(env)
         if g_bRetry:
             if os.getenv('CLEANUP') is not None:
                 print "Exception in user code:"
                 print '-' * 60
                 traceback.print_stack()
                 print '-' * 60
-            sys.stderr.write("Failed while executing:\n" + x + "\nFrom this directory:\n" + os.getcwd())
+            sys.stderr.write("Failed while executing:\n" + x + "\nFrom this directory:\n" + (cwd or os.getcwd()))
             sys.stdout.flush()
             sys.stderr.flush()
             if os.getenv('CLEANUP') is None:
@@ -168,7 +407,17 @@ def mysystem(x, outputDir=None):
             else:
                 panic("\nFailed to compile...")
         else:
-            panic("Failed while executing:\n" + x + "\nFrom this directory:\n" + os.getcwd())
+            panic("Failed while executing:\n" + x + "\nFrom this directory:\n" + (cwd or os.getcwd()))
+
+
+def mysystems(cmds, cwd=None, env=None):
+    '''Runs independent cmds concurrently (as jobs) - each one as mysystem does'''
+    pool = JobPool(kind="cmd")
+    for x in cmds:
+        pool.submit(x, mysystem, x, None, cwd, env)
+    failed = pool.waitAll()
+    if failed:
+        panic("Failed while executing:\n\t" + "\n\t".join(failed))
 
 
 def getSingleLineFromCmdOutput(cmd):
@@ -183,6 +432,47 @@ def getSingleLineFromCmdOutput(cmd):
         panic("Failed to spawn '%s'" % cmd)
 
 
+def FindInPath(program):
+    '''Returns the full path of the program, as found in the PATH - or None'''
+    for folder in os.getenv("PATH", "").split(os.pathsep):
+        candidate = os.path.join(folder, program)
+        if os.path.isfile(candidate) and os.access(candidate, os.X_OK):
+            return os.path.abspath(candidate)
+    return None
+
+
+def QueryTool(tool, args):
+    '''Returns the (single line) output of a query to a tool, e.g. QueryTool("taste-config", "--prefix")
+
+    The answers are memoized for the rest of the build, and recorded in the build
+    state for the next ones - for as long as the tool found in the PATH has the
+    same path and mtime. So only side-effect free queries must be asked here.'''
+    path = FindInPath(tool)
+    if path is None:
+        # Let it fail in the usual way
+        return getSingleLineFromCmdOutput(tool + " " + args)
+    return MemoizedToolAnswer(path, path + " " + args, lambda: getSingleLineFromCmdOutput("\"%s\" %s" % (path, args)))
+
+
+def MemoizedToolAnswer(path, key, ask):
+    '''Returns what ask() answered for the key the last time - if the tool at path still has
+    the same mtime and size; otherwise calls ask(), and remembers its answer (see QueryTool)'''
+    st = os.stat(path)
+    stamp = "%d %d" % (int(st.st_mtime * 1e9), st.st_size)
+    known = g_toolAnswers.get(key)
+    if known is None and g_buildState is not None:
+        recorded = g_buildState.get("toolQueries", key)
+        if recorded is not None:
+            known = tuple(recorded.split("\t", 1))
+    if known is not None and known[0] == stamp:
+        return known[1]
+    answer = ask()
+    g_toolAnswers[key] = (stamp, answer)
+    if g_buildState is not None:
+        g_buildState.update("toolQueries", {key: stamp + "\t" + answer})
+    return answer
+
+
 def banner(msg):
     '''Splashes message in big green letters'''
     if sys.stdout.isatty():
@@ -221,20 +511,138 @@ def usage():
           "-d, --with-extra-Ada-code deploymentPartition:directoryWithADBfiles\n\tDirectory containing additional .adb files to be compiled and linked in for deploymentPartition\n\n"
           "-l, --with-extra-lib deploymentPartition:/path/to/libLibrary1.a<,/path/to/libLibrary2.a,...>\n\tAdditional libraries to be linked in for deploymentPartition\n\n"
           "-w, --with-cv-attributes properties_filename\n\tUpdate thread priorities, stack size and offset/phase during the build\n\n"
-          "-x, --timer granularityInMilliseconds\n\tSet timer resolution (default: 100ms)")
+          "-x, --timer granularityInMilliseconds\n\tSet timer resolution (default: 100ms)\n\n"
+          "--jobs N\n\tRun up to N build jobs in parallel (default: number of usable CPUs,\n\tas limited by the CPU affinity and the cgroup CPU quota)\n\n"
+          "--parallel-partitions\n\tBuild independent partitions (nodes) concurrently\n\n"
+          "--memory-budget MB\n\tStart new build jobs only while the memory they needed in earlier runs\n\tfits in MB (default: the available memory - 0 means no limit)\n\n"
+          "--cache-size MB\n\tKeep up to MB of compiled objects and generated code in the object cache (default: 1024 - 0 disables it)\n\n"
+          "--cache-dir folder\n\tKeep the object cache in this folder, e.g. one shared by all the builds on this host\n\t(default: $TASTE_CACHE_DIR, or a folder inside the output folder)")
+
+
+def FileStatKey(st):
+    '''What tells us (without reading it) that a file changed: its size, mtime (in ns) and inode'''
+    return "%d %d %d" % (st.st_size, int(st.st_mtime * 1e9), st.st_ino)
 
 
 def md5hash(filename):
-    '''Returns MD5 hash of input filename'''
+    '''Returns MD5 hash of input filename
+
+    The file is only read if its size, mtime or inode differ from the ones it had
+    when it was last hashed (in this build or in an earlier one).'''
+    path = os.path.abspath(filename)
+    st = os.stat(path)
+    statKey = FileStatKey(st)
+    known = g_fileHashes.get(path)
+    if known is None and g_buildState is not None:
+        recorded = g_buildState.get("fileHashes", path)
+        if recorded is not None:
+            parts = recorded.split()
+            known = (" ".join(parts[:3]), parts[3], float(parts[4]))
+            g_fileHashes[path] = known
+    if known is not None:
+        knownStatKey, digest, hashedAt = known
+        # Changes made within the same timestamp tick as the hashing can't be seen in the
+        # mtime - so files modified (just) before they were hashed are always hashed again
+        if knownStatKey == statKey and st.st_mtime < hashedAt - 1:
+            return digest
+    hashedAt = time.time()
     a = hashlib.md5()
-    a.update(open(filename, 'r').read())
-    return a.hexdigest()
+    f = open(path, 'rb')
+    for chunk in iter(lambda: f.read(1 << 20), ''):
+        a.update(chunk)
+    f.close()
+    digest = a.hexdigest()
+    g_fileHashes[path] = (statKey, digest, hashedAt)
+    if g_buildState is not None:
+        g_buildState.update("fileHashes", {path: "%s %s %r" % (statKey, digest, hashedAt)})
+    return digest
+
+
+class BuildStateStore(object):
+    '''The state that is kept across builds (e.g. the MD5 hashes of the inputs of the stages)
+
+    It is an SQLite database, with one (namespace, key) -> value table. Each
+    update is a single transaction of upserts, so parallel stages (i.e. forked
+    processes, each with its own connection) can safely write at the same time.'''
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.pid = None
+        self.db = None
+        db = self.connection()
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("CREATE TABLE IF NOT EXISTS state ("
+                   "namespace TEXT, key TEXT, value TEXT, PRIMARY KEY (namespace, key))")
+
+    def connection(self):
+        # SQLite connections must not be used across fork() - each process opens its own
+        if self.pid != os.getpid():
+            self.db = sqlite3.connect(self.filename, timeout=600, isolation_level=None)
+            self.db.text_factory = str
+            # With WAL, this is still safe against corruption - and saves an fsync per transaction
+            self.db.execute("PRAGMA synchronous=NORMAL")
+            self.pid = os.getpid()
+        return self.db
+
+    def get(self, namespace, key):
+        '''Returns the value of the key in the namespace - or None, if there is no such key'''
+        row = self.connection().execute(
+            "SELECT value FROM state WHERE namespace = ? AND key = ?", (namespace, key)).fetchone()
+        return None if row is None else row[0]
+
+    def items(self, namespace):
+        '''Returns the contents of the namespace as a dictionary'''
+        return dict(self.connection().execute(
+            "SELECT key, value FROM state WHERE namespace = ?", (namespace,)))
+
+    def update(self, namespace, values):
+        '''Inserts (or replaces) the key/value pairs of the dictionary in the namespace'''
+        db = self.connection()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            db.executemany(
+                "INSERT OR REPLACE INTO state (namespace, key, value) VALUES (?, ?, ?)",
+                [(namespace, k, str(v)) for k, v in values.iteritems()])
+        except:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+
+    def compact(self):
+        '''Folds the write-ahead log into the database, and reclaims the space of deleted rows'''
+        db = self.connection()
+        db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        freePages = db.execute("PRAGMA freelist_count").fetchone()[0]
+        if freePages > db.execute("PRAGMA page_count").fetchone()[0] / 4:
+            db.execute("VACUUM")
+
+
+def OpenBuildState():
+    '''Opens the build state store of the output folder (the current one)'''
+    global g_buildState
+    g_buildState = BuildStateStore(os.path.abspath("buildState.sqlite"))
 
 
 def mkdirIfMissing(name):
     '''Creates a directory only if it is missing'''
     if not os.path.isdir(name):
-        os.mkdir(name)
+        try:
+            os.mkdir(name)
+        except OSError:
+            # A concurrently running stage may have just created it
+            if not os.path.isdir(name):
+                raise
+
+
+def makedirsIfMissing(name):
+    '''Creates a directory (and its missing parents) only if it is missing'''
+    if not os.path.isdir(name):
+        try:
+            os.makedirs(name)
+        except OSError:
+            # A concurrently running stage may have just created it
+            if not os.path.isdir(name):
+                raise
 
 
 def mflags(node):
@@ -277,7 +685,7 @@ def handleXenomaiCommon(functionName, option):
         platform = g_distributionNodesPlatform[functionName][0]
         if platform.startswith("PLATFORM_LINUX32_XENOMAI"):
             skin = platform.split("_")[-1].lower()
-            return " " + getSingleLineFromCmdOutput("xeno-config --skin=%s --%s" % (skin, option)) + " "
+            return " " + QueryTool("xeno-config", "--skin=%s --%s" % (skin, option)) + " "
         else:
             return " "
     else:
@@ -330,7 +738,7 @@ def handlePoHiC(functionName):
     if g_bPolyORB_HI_C and polyorbActivityHpath != "":
         extraCdirIncludes += " -I " + polyorbActivityHpath
     if g_bPolyORB_HI_C:
-        extraCdirIncludes += " -I " + getSingleLineFromCmdOutput("ocarina-config --prefix") + \
+        extraCdirIncludes += " -I " + QueryTool("ocarina-config", "--prefix") + \
             "/include/ocarina/runtime/polyorb-hi-c/include/"
     return extraCdirIncludes
 
@@ -386,21 +794,21 @@ def SetEnvForRTEMS(platformType):
         src = None
         if platformType.startswith("PLATFORM_X86_RTEMS"):
             src = "RTEMS_MAKEFILE_PATH_X86"
-            os.putenv("RTEMS_MAKEFILE_PATH", os.environ[src])
+            os.environ["RTEMS_MAKEFILE_PATH"] = os.environ[src]
         elif platformType.startswith("PLATFORM_LEON_RTEMS"):
             src = "RTEMS_MAKEFILE_PATH_LEON"
-            os.putenv("RTEMS_MAKEFILE_PATH", os.environ[src])
+            os.environ["RTEMS_MAKEFILE_PATH"] = os.environ[src]
         elif platformType.startswith("PLATFORM_NDS_RTEMS"):
             src = "RTEMS_MAKEFILE_PATH_NDS"
-            os.putenv("RTEMS_MAKEFILE_PATH", os.environ[src])
+            os.environ["RTEMS_MAKEFILE_PATH"] = os.environ[src]
         elif platformType.startswith("PLATFORM_GUMSTIX_RTEMS"):
             src = "RTEMS_MAKEFILE_PATH_GUMSTIX"
-            os.putenv("RTEMS_MAKEFILE_PATH", os.environ[src])
+            os.environ["RTEMS_MAKEFILE_PATH"] = os.environ[src]
         if src is not None:
             RMP = os.environ[src]
             RCCPATH = os.sep.join(RMP.split(os.sep)[:-2] + ["bin"])
             if RCCPATH not in os.getenv("PATH"):
-                os.putenv("PATH", RCCPATH + ":" + os.getenv("PATH"))
+                os.environ["PATH"] = RCCPATH + ":" + os.getenv("PATH")
     except KeyError:
         panic("You must configure %s in your environment" % src)
 
@@ -410,15 +818,16 @@ def UpdateEnvForNode(node):
     if node not in g_distributionNodesPlatform:
         panic("%s did not exist in the 'nodes' file" % node)
     kind, pref = g_distributionNodesPlatform[node]
+    # Set via os.environ, so that the compiler can also be identified from here (e.g. in CompileSources)
     if kind == "PLATFORM_NATIVE_COMPCERT":
-        os.putenv("GNATGCC", "ccomp")
+        os.environ["GNATGCC"] = "ccomp"
     else:
-        os.putenv("GNATGCC", pref + "gcc")
-        os.putenv("GNATGXX", pref + "g++")
-    os.putenv("GNATMAKE", pref + "gnatmake")
-    os.putenv("GNATBIND", pref + "gnatbind")
-    os.putenv("GNATLINK", pref + "gnatlink")
-    os.putenv("OBJCOPY", pref + "objcopy")
+        os.environ["GNATGCC"] = pref + "gcc"
+        os.environ["GNATGXX"] = pref + "g++"
+    os.environ["GNATMAKE"] = pref + "gnatmake"
+    os.environ["GNATBIND"] = pref + "gnatbind"
+    os.environ["GNATLINK"] = pref + "gnatlink"
+    os.environ["OBJCOPY"] = pref + "objcopy"
     platformType = g_distributionNodesPlatform[node][0]
     SetEnvForRTEMS(platformType)
 
@@ -496,6 +905,430 @@ def DetermineNumberOfCPUs():
     raise Exception('Can not determine number of CPUs on this system')
 
 
+def CPUsInAffinityMask():
+    '''Number of CPUs we are allowed to run on (as per sched_getaffinity), or None if unknown'''
+    try:
+        for line in open('/proc/self/status'):
+            if line.startswith('Cpus_allowed_list:'):
+                res = 0
+                for r in line.split(':')[1].strip().split(','):
+                    first, _, last = r.partition('-')
+                    res += int(last or first) - int(first) + 1
+                return res if res > 0 else None
+    except (IOError, ValueError):
+        pass
+    return None
+
+
+def ReadCgroupFiles(v1Controller, v1Files, v2Files):
+    '''Reads the given files of our cgroup (v1 or v2) and of all its ancestors - returns the (split) contents of each
+
+    For cgroup v1, the files are searched for in the hierarchy of v1Controller (e.g. 'cpu').'''
+    res = []
+    try:
+        cgroups = open('/proc/self/cgroup').readlines()
+    except IOError:
+        return res
+    for line in cgroups:
+        parts = line.strip().split(':', 2)
+        if len(parts) != 3:
+            continue
+        _, controllers, path = parts
+        if controllers == "":
+            roots = ['/sys/fs/cgroup', '/sys/fs/cgroup/unified']
+            files = v2Files
+        elif v1Controller in controllers.split(','):
+            roots = ['/sys/fs/cgroup/' + controllers, '/sys/fs/cgroup/' + v1Controller]
+            files = v1Files
+        else:
+            continue
+        for root in roots:
+            # In containers, our own cgroup path is usually not visible - only the root is
+            folder = (root + path).rstrip('/')
+            while not os.path.isdir(folder) and folder != root:
+                folder = os.path.dirname(folder)
+            while True:
+                try:
+                    res.append(" ".join(open(folder + os.sep + f).read().strip() for f in files).split())
+                except IOError:
+                    pass
+                if folder == root:
+                    break
+                folder = os.path.dirname(folder)
+    return res
+
+
+def CPUsInCgroupQuota():
+    '''Number of CPUs allowed by the cgroup (v1 or v2) CPU quota, or None if there is no quota
+
+    The quota may be set on any of the ancestors of our cgroup, so the tightest one wins.'''
+    quotas = []
+    # e.g. "400000 100000" (or "max 100000") for v2, and "400000" "100000" (or "-1" ...) for v1
+    for values in ReadCgroupFiles('cpu', ('cpu.cfs_quota_us', 'cpu.cfs_period_us'), ('cpu.max',)):
+        try:
+            if values[0] not in ("max", "-1") and int(values[1]) > 0:
+                quotas.append(int(values[0]) / float(values[1]))
+        except (ValueError, IndexError):
+            pass
+    if not quotas:
+        return None
+    return max(1, int(math.ceil(min(quotas))))
+
+
+def DetermineJobBudget():
+    '''Number of jobs to run in parallel by default: the CPUs we can actually use
+
+    That is, the CPUs of the machine, limited by our affinity mask and by the
+    CPU quota of our cgroup (e.g. a CI container limited to 4 CPUs on a 64-core host).'''
+    res = DetermineNumberOfCPUs()
+    for limit in (CPUsInAffinityMask(), CPUsInCgroupQuota()):
+        if limit is not None:
+            res = min(res, limit)
+    return max(1, res)
+
+
+def DetermineMemoryBudget():
+    '''Default memory budget (in MB) for the jobs running at the same time - 0 if it can't be determined
+
+    That is, the memory available right now, limited by the memory limit of our cgroup.'''
+    res = 0
+    try:
+        for line in open('/proc/meminfo'):
+            if line.startswith('MemAvailable:'):
+                res = int(line.split()[1]) / 1024
+    except (IOError, ValueError):
+        pass
+    for values in ReadCgroupFiles('memory', ('memory.limit_in_bytes',), ('memory.max',)):
+        try:
+            limit = int(values[0]) / (1024 * 1024)
+        except (ValueError, IndexError):
+            # "max", i.e. no limit
+            continue
+        if res == 0 or limit < res:
+            res = limit
+    return res
+
+
+def StartMemoryAccounting():
+    '''Reads the peak RSS of the jobs of earlier runs, and starts accounting for the memory of the running jobs'''
+    global g_memoryInUse
+    for name, memory in g_buildState.items("jobsMemory").iteritems():
+        g_jobMemoryEstimates[name] = int(memory)
+    if g_memoryBudget > 0:
+        # Shared by all the processes we will fork
+        g_memoryInUse = multiprocessing.Value('d', 0.0)
+
+
+def RecordJobMemory(name, rusage):
+    '''Remembers (for this and future runs) the peak RSS of a job, as reported by wait4'''
+    if rusage is None or g_buildState is None:
+        return
+    memory = rusage.ru_maxrss / 1024
+    g_jobMemoryEstimates[name] = memory
+    g_buildState.update("jobsMemory", {name: memory})
+
+
+def ReserveMemory(memory, bForce=False):
+    '''Reserves memory (in MB) for a job that is about to start
+
+    Fails if the memory budget would be exceeded - unless bForce is set.'''
+    if g_memoryInUse is None:
+        return True
+    with g_memoryInUse.get_lock():
+        if not bForce and g_memoryInUse.value + memory > g_memoryBudget:
+            return False
+        g_memoryInUse.value += memory
+    return True
+
+
+def UnreserveMemory(memory):
+    '''Gives back the memory (in MB) reserved for a job'''
+    if g_memoryInUse is not None:
+        with g_memoryInUse.get_lock():
+            g_memoryInUse.value -= memory
+
+
+def WaitForChild(pids):
+    '''Blocks until one of the given child processes terminates - returns (pid, status, rusage)'''
+    while True:
+        for pid in pids:
+            if pid in g_reapedChildren:
+                status, rusage = g_reapedChildren.pop(pid)
+                return pid, status, rusage
+        try:
+            pid, status, rusage = os.wait4(-1, 0)
+        except OSError as e:
+            if e.errno == errno.EINTR:
+                continue
+            raise
+        # Keep it around - it may belong to a different JobPool
+        g_reapedChildren[pid] = (status, rusage)
+
+
+def StartJobServer(maxJobs):
+    '''Creates the jobserver pipe with tokens for maxJobs jobs, and advertises it to make via MAKEFLAGS
+
+    If we are ourselves run from a make that has a jobserver, we join its pool instead.'''
+    global g_jobServer
+    m = re.search(r'--jobserver-(?:fds|auth)=(\d+),(\d+)', os.getenv("MAKEFLAGS", ""))
+    if m:
+        r, w = int(m.group(1)), int(m.group(2))
+        try:
+            os.fstat(r)
+            os.fstat(w)
+            g_jobServer = (r, w)
+            return
+        except OSError:
+            # The parent make did not pass them down to us (no '+' in its rule)
+            pass
+    r, w = os.pipe()
+    # One job slot is implicitly ours
+    os.write(w, '+' * (maxJobs - 1))
+    g_jobServer = (r, w)
+    # Keep the flags that were already there (e.g. -k, or the variable overrides after a "--"),
+    # except for the ones about the jobs
+    makeFlags = re.sub(r'(?<!\S)(-j\d*|--jobserver-(?:fds|auth)=\S+)(?!\S)', '', " " + os.getenv("MAKEFLAGS", ""))
+    head, sep, tail = makeFlags.partition(" -- ")
+    os.environ["MAKEFLAGS"] = head.rstrip() + " -j --jobserver-fds=%d,%d" % (r, w) + sep + tail
+
+
+def AcquireJobToken():
+    '''Blocks until a token is available in the jobserver, and returns it'''
+    while True:
+        try:
+            return os.read(g_jobServer[0], 1)
+        except OSError as e:
+            if e.errno != errno.EINTR:
+                raise
+
+
+def ReleaseJobToken(token):
+    '''Gives back a token to the jobserver'''
+    os.write(g_jobServer[1], token)
+
+
+def ForkJob(func, args, memory=0):
+    '''Calls func(*args) in a forked child - returns the child's pid and the file where the result will be
+
+    The memory (in MB) is what has been reserved for the child.'''
+    fd, resultFile = tempfile.mkstemp(prefix="tasteJob")
+    # Don't let the child inherit (and then re-emit) our buffered output
+    sys.stdout.flush()
+    sys.stderr.flush()
+    if g_log is not None:
+        g_log.flush()
+    pid = os.fork()
+    if pid == 0:
+        exitCode = 1
+        try:
+            # Nobody can press ENTER for us in here
+            global g_bRetry, g_memoryOfThisJob
+            g_bRetry = False
+            g_memoryOfThisJob = memory
+            token = None
+            if g_jobServer is not None:
+                token = AcquireJobToken()
+            try:
+                result = func(*args)
+            finally:
+                if token is not None:
+                    ReleaseJobToken(token)
+            f = os.fdopen(fd, 'wb')
+            cPickle.dump(result, f, cPickle.HIGHEST_PROTOCOL)
+            f.close()
+            exitCode = 0
+        except SystemExit as e:
+            exitCode = e.code if isinstance(e.code, int) else 1
+        except:
+            traceback.print_exc()
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(exitCode)
+    os.close(fd)
+    return pid, resultFile
+
+
+JobOutcome = collections.namedtuple('JobOutcome', ['key', 'success', 'result', 'wallTime', 'rusage'])
+
+
+class JobPool(object):
+    '''Runs python callables in forked children, with at most maxJobs of them alive at any time.
+
+    Children are reaped as soon as they terminate, and the next pending job
+    is started right away - as long as the peak RSS that the jobs had in earlier
+    runs (looked up by kind and key) fits in the memory budget. With maxJobs == 1,
+    the jobs are simply called in-process, in submission order (i.e. the old,
+    serial behaviour).'''
+
+    def __init__(self, maxJobs=None, kind="job"):
+        self.maxJobs = max(1, maxJobs or g_maxJobs)
+        self.kind = kind
+        self.pending = []
+        self.running = {}
+        self.finished = []
+
+    def submit(self, key, func, *args):
+        if self.maxJobs == 1:
+            startTime = time.time()
+            result = func(*args)
+            self.finished.append(JobOutcome(key, True, result, time.time() - startTime, None))
+        else:
+            self.pending.append((key, func, args))
+            self.startPending()
+
+    def jobName(self, key):
+        return "%s:%s" % (self.kind, key)
+
+    def estimateMemory(self, key):
+        '''The peak RSS (in MB) the job had in the last run - or, for new jobs, the biggest one of the same kind'''
+        name = self.jobName(key)
+        if name in g_jobMemoryEstimates:
+            return g_jobMemoryEstimates[name]
+        prefix = self.kind + ":"
+        return max([v for k, v in g_jobMemoryEstimates.iteritems() if k.startswith(prefix)] or [0])
+
+    def startPending(self):
+        while self.pending and len(self.running) < self.maxJobs:
+            key, func, args = self.pending[0]
+            memory = self.estimateMemory(key)
+            # If none of our jobs is running, there's nothing to wait for - so go ahead anyway
+            if not ReserveMemory(memory, bForce=not self.running):
+                break
+            self.pending.pop(0)
+            pid, resultFile = ForkJob(func, args, memory)
+            self.running[pid] = (key, resultFile, time.time(), memory)
+
+    def busy(self):
+        return len(self.pending) + len(self.running) + len(self.finished) != 0
+
+    def waitOne(self):
+        '''Waits for the next job to complete, and returns its JobOutcome'''
+        if self.finished:
+            return self.finished.pop(0)
+        # We do nothing while waiting - so lend our own token and memory to the jobs
+        UnreserveMemory(g_memoryOfThisJob)
+        if g_jobServer is not None:
+            ReleaseJobToken('+')
+            pid, status, rusage = WaitForChild(self.running.keys())
+            AcquireJobToken()
+        else:
+            pid, status, rusage = WaitForChild(self.running.keys())
+        ReserveMemory(g_memoryOfThisJob, bForce=True)
+        key, resultFile, startTime, memory = self.running.pop(pid)
+        UnreserveMemory(memory)
+        RecordJobMemory(self.jobName(key), rusage)
+        success = os.WIFEXITED(status) and os.WEXITSTATUS(status) == 0
+        result = None
+        if success:
+            f = open(resultFile, 'rb')
+            result = cPickle.load(f)
+            f.close()
+        os.unlink(resultFile)
+        self.startPending()
+        return JobOutcome(key, success, result, time.time() - startTime, rusage)
+
+    def waitAll(self):
+        '''Waits for all jobs to complete - returns the keys of the ones that failed'''
+        failed = []
+        while self.busy():
+            outcome = self.waitOne()
+            if not outcome.success:
+                failed.append(outcome.key)
+        return failed
+
+
+class Stage(object):
+    '''A step of the build, along with the artifacts it consumes and produces.
+
+    The func is called with the dictionary of the artifacts produced so far,
+    and its result is stored under the output names (a tuple result is spread
+    over them; any remaining output names just mark files/folders created by
+    the stage).
+    Stages that update the global state of the orchestrator must be run
+    in-process (bForked=False); all others are run in forked children.'''
+
+    def __init__(self, name, func, inputs=(), outputs=(), bForked=True):
+        self.name = name
+        self.func = func
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.bForked = bForked
+
+    def store(self, result, artifacts):
+        if len(self.outputs) == 1:
+            values = [result]
+        elif isinstance(result, tuple):
+            values = list(result)
+        else:
+            values = []
+        values += [None] * (len(self.outputs) - len(values))
+        for name, value in zip(self.outputs, values):
+            artifacts[name] = value
+
+
+def RunStages(stages, artifacts=None):
+    '''Executes the build stages as soon as their inputs are available - returns all artifacts
+
+    The stages must be listed in a valid serial order; with a single job, that
+    is exactly the order they will run in.'''
+    artifacts = dict(artifacts or {})
+    available = set(artifacts.keys())
+    for stage in stages:
+        for i in stage.inputs:
+            if i not in available:
+                panic("Build stage '%s' needs '%s', which no earlier stage produces" % (stage.name, i))
+        available.update(stage.outputs)
+
+    pool = JobPool(kind="stage")
+    cwd = os.getcwd()
+    waiting = list(stages)
+    inFlight = {}
+    failed = []
+    while waiting or inFlight:
+        ready = [s for s in waiting if all(i in artifacts for i in s.inputs)]
+        if not failed:
+            # Launch whatever can run in the background first...
+            for stage in ready:
+                if stage.bForked and pool.maxJobs > 1:
+                    waiting.remove(stage)
+                    inFlight[stage.name] = stage
+                    os.chdir(cwd)
+                    pool.submit(stage.name, stage.func, artifacts)
+            # ...and then do the first in-process one ourselves
+            inProcess = [s for s in ready if s in waiting]
+            if inProcess:
+                stage = inProcess[0]
+                waiting.remove(stage)
+                startTime = time.time()
+                before = (resource.getrusage(resource.RUSAGE_SELF), resource.getrusage(resource.RUSAGE_CHILDREN))
+                try:
+                    stage.store(stage.func(artifacts), artifacts)
+                except BaseException:
+                    # (e.g. a panic) Don't leave the stages running in the background behind,
+                    # still writing into the output folder
+                    if inFlight:
+                        sys.stderr.write("Waiting for the build stage(s) still running: %s\n" % ", ".join(inFlight))
+                        pool.waitAll()
+                    raise
+                TraceEvent(stage.name, "stage", startTime, time.time() - startTime, RusageSince(before))
+                os.chdir(cwd)
+                continue
+        if not inFlight:
+            break
+        outcome = pool.waitOne()
+        stage = inFlight.pop(outcome.key)
+        TraceEvent(stage.name, "stage", time.time() - outcome.wallTime, outcome.wallTime, outcome.rusage,
+                   {"forked": True, "success": outcome.success})
+        if outcome.success:
+            stage.store(outcome.result, artifacts)
+        else:
+            failed.append(stage.name)
+    os.chdir(cwd)
+    if failed:
+        panic("Build stage(s) failed: " + ", ".join(failed))
+    return artifacts
+
+
 patternCO = re.compile(r'^.*?<compiler-option>(.*?)</compiler-option>(.*)$')
 patternLO = re.compile(r'^.*?<linker-option>(.*?)</linker-option>(.*)$')
 
@@ -519,10 +1352,268 @@ def CheckDirectives(baseDir):
                         break
 
 
+def CompileSources(compiler, cflags, sources="*.c"):
+    '''Compiles (-c) each of the sources matching the patterns, as a separate job
+
+    The outcome is the same as that of a single "compiler -c cflags sources"
+    invocation from the current folder - but the translation units are
+    compiled in parallel, objects whose inputs did not change since the last
+    build are not recompiled, and the others are fetched from the object cache
+    whenever possible.'''
+    files = []
+    for pattern in sources.split():
+        files.extend(sorted(glob.glob(pattern)))
+    if not files:
+        # Let the compiler complain about it, as it always did
+        mysystem("%s -c %s %s" % (compiler, cflags, sources))
+        return
+    identity = None
+    if g_objectCache is not None and not g_uncacheableFlags.search(cflags):
+        identity = CompilerIdentity(compiler) + cflags
+        if re.search(r'(^|\s)-g', cflags):
+            # The debug information refers to the build folder
+            identity += os.getcwd()
+    compilerPath = os.path.expandvars(compiler).strip('"')
+    if os.sep not in compilerPath:
+        compilerPath = FindInPath(compilerPath)
+    recipe = hashlib.md5("\0".join([
+        os.path.expandvars(compiler), os.path.expandvars(cflags), os.getcwd(),
+        md5hash(compilerPath) if compilerPath and os.path.isfile(compilerPath) else ""])).hexdigest()
+    pool = JobPool(kind="cc " + os.getcwd())
+    for f in files:
+        pool.submit(f, CompileSource, compiler, cflags, f, identity, recipe)
+    failed = pool.waitAll()
+    if failed:
+        panic("Failed to compile %s (in %s)" % (", ".join(failed), os.getcwd()))
+
+
+class ContentCache(object):
+    '''A content-addressed store of files, kept under maxSize MB by evicting the least recently used ones.
+
+    The entries are named after a hash of whatever determines their contents;
+    entries are written atomically, so concurrent jobs (and concurrent builds,
+    when the cache folder is shared via --cache-dir) can safely share the cache.
+    The hit/miss counters are shared by all the processes forked after creation.'''
+
+    def __init__(self, rootDir, maxSize):
+        self.rootDir = rootDir
+        self.maxSize = maxSize
+        self.makeFolder(rootDir)
+        self.hits = multiprocessing.Value('l', 0)
+        self.misses = multiprocessing.Value('l', 0)
+
+    def path(self, key):
+        return self.rootDir + os.sep + key[:2] + os.sep + key
+
+    def makeFolder(self, folder):
+        '''Creates a folder of the cache (another build may be creating it too)
+
+        The folders are group-writable and setgid, so that all the users of a shared
+        cache can add entries to them - whatever their umask is.'''
+        if not os.path.isdir(folder):
+            makedirsIfMissing(folder)
+            try:
+                os.chmod(folder, 02775)
+            except OSError:
+                # Created by another user
+                pass
+
+    def count(self, counter):
+        with counter.get_lock():
+            counter.value += 1
+
+    def fetch(self, key, dest):
+        '''Copies the entry to dest - returns False if there is no such entry'''
+        entry = self.path(key)
+        if not os.path.isfile(entry):
+            self.count(self.misses)
+            return False
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(dest)), prefix=".tasteCache")
+        os.close(fd)
+        try:
+            shutil.copyfile(entry, tmp)
+            os.rename(tmp, dest)
+        except (IOError, OSError):
+            # Evicted under our feet
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            self.count(self.misses)
+            return False
+        # Mark it as recently used
+        try:
+            os.utime(entry, None)
+        except OSError:
+            pass
+        self.count(self.hits)
+        return True
+
+    def store(self, key, src):
+        '''Copies the file src into the cache, as the entry for key
+
+        This is best-effort: if the cache can't be written to (e.g. the disk is full,
+        or the folder belongs to another user of a shared cache), the entry is skipped.'''
+        entry = self.path(key)
+        tmp = None
+        try:
+            self.makeFolder(os.path.dirname(entry))
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(entry), prefix=".tasteCache")
+            os.close(fd)
+            shutil.copyfile(src, tmp)
+            # mkstemp creates it readable only by us - but the cache may be shared
+            os.chmod(tmp, 0644)
+            os.rename(tmp, entry)
+        except (IOError, OSError) as e:
+            print "Failed to store", src, "in the cache:", str(e)
+            sys.stdout.flush()
+            if tmp is not None and os.path.exists(tmp):
+                try:
+                    os.unlink(tmp)
+                except OSError:
+                    pass
+
+    def trim(self):
+        '''Evicts the least recently used entries, until the cache fits in its maximum size'''
+        entries = []
+        total = 0
+        for root, _, files in os.walk(self.rootDir):
+            for f in files:
+                path = root + os.sep + f
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+                total += st.st_size
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.maxSize * 1024 * 1024:
+                break
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+            total -= size
+
+    def report(self, description):
+        hits, misses = self.hits.value, self.misses.value
+        if hits + misses != 0:
+            g_stageLog.info("%s: %d hits, %d misses (%d%% hit rate)" % (
+                description, hits, misses, 100 * hits / (hits + misses)))
+
+
+def StartObjectCache():
+    '''Opens the object cache (under the output folder, or --cache-dir) - unless it was disabled with "--cache-size 0"'''
+    global g_objectCache
+    if g_cacheSize > 0:
+        g_objectCache = ContentCache(g_cacheDir or g_absOutputDir + os.sep + "objectCache", g_cacheSize)
+
+
+def CompilerIdentity(compiler):
+    '''Identifies the compiler that e.g. "$GNATGCC" currently stands for, via its version and target
+
+    The answer is memoized (see MemoizedToolAnswer) for the expanded compiler command.'''
+    ask = lambda: os.popen("%s --version 2>&1 ; %s -dumpmachine 2>&1" % (compiler, compiler)).read()
+    argv = SplitCommand(os.path.expandvars(compiler))
+    if not argv:
+        return ask()
+    path = FindInPath(argv[0]) if os.sep not in argv[0] else os.path.abspath(argv[0])
+    if path is None or not os.path.isfile(path):
+        return ask()
+    return MemoizedToolAnswer(path, " ".join([path] + argv[1:] + ["--version", "-dumpmachine"]), ask)
+
+
+def ObjectIsUpToDate(obj, recipe):
+    '''Tells whether the object was built with the same recipe (compiler and CFLAGS) from
+    the same source and headers - as recorded by RememberObjectDeps in an earlier build'''
+    recorded = g_buildState.get("objectDeps", os.path.abspath(obj))
+    if recorded is None or not os.path.isfile(obj):
+        return False
+    lines = recorded.split('\n')
+    # If its symbols were renamed, the object as it was built is kept next to it (see PatchObjects)
+    built = obj + ".unpatched" if os.path.isfile(obj + ".unpatched") else obj
+    if lines[0] != recipe + ' ' + FileStatKey(os.stat(built)):
+        return False
+    for line in lines[1:]:
+        digest, path = line.split(' ', 1)
+        if not os.path.isfile(path) or md5hash(path) != digest:
+            return False
+    return True
+
+
+def RememberObjectDeps(obj, recipe, deps):
+    '''Records the recipe and the source/headers (with their hashes) that the object was built from'''
+    if os.path.isfile(obj):
+        g_buildState.update("objectDeps", {
+            os.path.abspath(obj): '\n'.join(
+                [recipe + ' ' + FileStatKey(os.stat(obj))] +
+                [md5hash(d) + ' ' + d for d in sorted(deps) if os.path.isfile(d)])})
+
+
+def CompileSource(compiler, cflags, source, identity=None, recipe=None):
+    '''Compiles (-c) a single source - or fetches its object from the object cache
+
+    If the object was already built with the same recipe from the same source
+    and headers (as listed in the line markers of the preprocessed source),
+    nothing is done. Otherwise the object is looked up by the identity of the
+    compiler and the CFLAGS, along with the preprocessed source. Without an
+    identity, the object cache is not used.'''
+    cmd = "%s -c %s \"%s\"" % (compiler, cflags, source)
+    obj = os.path.splitext(os.path.basename(source))[0] + ".o"
+    if recipe is not None and ObjectIsUpToDate(obj, recipe):
+        g_log.write("From: " + os.getcwd() + "\n")
+        g_log.write("(up to date) " + cmd + "\n")
+        g_log.flush()
+        return
+    if identity is None and recipe is None:
+        mysystem(cmd)
+        return
+    key = hashlib.md5(identity or "")
+    deps = set([os.path.abspath(source)])
+    preprocessor = subprocess.Popen(
+        "%s -E %s \"%s\"" % (compiler, cflags, source), shell=True,
+        stdout=subprocess.PIPE, stderr=open(os.devnull, 'w'))
+    for line in iter(preprocessor.stdout.readline, ''):
+        if line.startswith('# '):
+            marker = re.match(r'# \d+ "(.*)"', line)
+            if marker and not marker.group(1).startswith('<'):
+                deps.add(os.path.abspath(marker.group(1)))
+        key.update(line)
+    if preprocessor.wait() != 0:
+        # Let the compiler report the problem
+        mysystem(cmd)
+        return
+    key = key.hexdigest()
+    if identity is not None and g_objectCache.fetch(key, obj):
+        g_log.write("From: " + os.getcwd() + "\n")
+        g_log.write("(object cache hit) " + cmd + "\n")
+        g_log.flush()
+    else:
+        mysystem(cmd)
+        if identity is not None and os.path.isfile(obj):
+            g_objectCache.store(key, obj)
+    if recipe is not None:
+        RememberObjectDeps(obj, recipe, deps)
+
+
+def LearnDirectives(baseDir, codeDir):
+    '''Runs CheckDirectives from inside the folder with the code of a subsystem'''
+    # The directives update the flags of the whole partition, so they are
+    # always learned by the orchestrator itself (not by a forked job)
+    olddir = os.getcwd()
+    os.chdir(codeDir)
+    CheckDirectives(baseDir)
+    os.chdir(olddir)
+
+
+def SubsystemJobName(toolDescription, baseDir):
+    return "%s subsystem '%s'" % (toolDescription, baseDir)
+
+
 def CommonBuildingPart(
-    baseDir, toolDescription, CDirectories, cflagsSoFar,
+    baseDir, toolDescription, CDirectories, cflagsSoFar, pool,
     buildCmd=lambda baseDir, cf:
-        mysystem("\"$GNATGCC\" -c %s -I ../../GlueAndBuild/glue%s/ -I ../../auto-src/ *.c" % (cf, baseDir))):
+        CompileSources("\"$GNATGCC\"", "%s -I ../../GlueAndBuild/glue%s/ -I ../../auto-src/" % (cf, baseDir)),
+        prepareCmd=None):
 
     '''The common build sequence for C, SCADE, Simulink'''
 
@@ -530,38 +1621,41 @@ def CommonBuildingPart(
         panic("No directory %s! (pwd=%s)" % (baseDir, os.getcwd()))
     if not os.path.isdir(baseDir + os.sep + baseDir):
         panic("%s zip file did not contain a %s dir..." % (toolDescription, baseDir))
-    os.chdir(baseDir + os.sep + baseDir)
-    CheckDirectives(baseDir)
-    mysystem("for i in %s_vm_if.c %s_vm_if.h %s.h ; do if [ -f ../$i ] ; then cp ../$i . ; fi ; done" %
-             (baseDir, baseDir, baseDir))
-    mysystem("for i in hpredef.h invoke_ri.c ; do if [ -f ../$i ] ; then cp ../$i . ; fi ; done")
-    mysystem("cp ../*polyorb_interface.? . 2>/dev/null || exit 0")
-    mysystem("cp ../Context-*.? . 2>/dev/null || exit 0")
-    mysystem("rm -f ../*-uniq.? *-uniq.? 2>/dev/null || exit 0")
-    mysystem("rm -f ../dataview.[ch] dataview.* 2>/dev/null || exit 0")
+    LearnDirectives(baseDir, baseDir + os.sep + baseDir)
     extraCdirIncludes = " "
     partitionName = g_fromFunctionToPartition[baseDir]
     if partitionName in CDirectories:
         for d in CDirectories[partitionName]:
             extraCdirIncludes += "-I \"" + d + "\" "
-    if (baseDir in g_distributionNodesPlatform.keys()):
-        UpdateEnvForNode(baseDir)
     cflags = cflagsSoFar + extraCdirIncludes + CalculateCFLAGS(baseDir) + CalculateUserCodeOnlyCFLAGS(baseDir)
     # Add include path to glue code
     cflags += " -I ../../GlueAndBuild/glue" + baseDir + "/ "
-    buildCmd(baseDir, cflags)
-    os.chdir("../..")
 
+    def buildSubsystem():
+        if prepareCmd is not None:
+            prepareCmd()
+        os.chdir(baseDir + os.sep + baseDir)
+        StageFiles(
+            ".",
+            sources=["../%s_vm_if.c" % baseDir, "../%s_vm_if.h" % baseDir, "../%s.h" % baseDir,
+                     "../hpredef.h", "../invoke_ri.c", "../*polyorb_interface.?", "../Context-*.?"],
+            remove=["../*-uniq.?", "*-uniq.?", "../dataview.[ch]", "dataview.*"])
+        if (baseDir in g_distributionNodesPlatform.keys()):
+            UpdateEnvForNode(baseDir)
+        buildCmd(baseDir, cflags)
+        os.chdir("../..")
+    pool.submit(SubsystemJobName(toolDescription, baseDir), buildSubsystem)
 
-def BuildSCADEsystems(scadeSubsystems, CDirectories, cflagsSoFar):
+
+def BuildSCADEsystems(scadeSubsystems, CDirectories, cflagsSoFar, pool):
     '''Compiles all user code for SCADE Functions'''
     if scadeSubsystems:
         g_stageLog.info("Building SCADE subSystems")
     for baseDir in scadeSubsystems.keys():
-        CommonBuildingPart(baseDir, "SCADE", CDirectories, cflagsSoFar)
+        CommonBuildingPart(baseDir, "SCADE", CDirectories, cflagsSoFar, pool)
 
 
-def BuildSimulinkSystems(simulinkSubsystems, CDirectories, cflagsSoFar, bUseSimulinkMakefiles):
+def BuildSimulinkSystems(simulinkSubsystems, CDirectories, cflagsSoFar, bUseSimulinkMakefiles, pool):
     '''Compiles all user code for Simulink Functions'''
     if simulinkSubsystems:
         g_stageLog.info("Building Simulink subSystems")
@@ -570,20 +1664,20 @@ def BuildSimulinkSystems(simulinkSubsystems, CDirectories, cflagsSoFar, bUseSimu
         if bUseSimulinkMakefiles[baseDir][0]:
             mysystem('make -f "' + bUseSimulinkMakefiles[baseDir][1] + '" assertBuild')
             if g_bPolyORB_HI_C:
-                mysystem("\"$GNATGCC\" -c %s *polyorb_interface.c" % cf)
+                CompileSources("\"$GNATGCC\"", cf, "*polyorb_interface.c")
         else:
-            mysystem("\"$GNATGCC\" -c %s *.c" % cf)
+            CompileSources("\"$GNATGCC\"", cf)
     for baseDir in simulinkSubsystems.keys():
-        CommonBuildingPart(baseDir, "Simulink", CDirectories, cflagsSoFar, buildCmdSimulink)
+        CommonBuildingPart(baseDir, "Simulink", CDirectories, cflagsSoFar, pool, buildCmdSimulink)
 
 
-def BuildMicroPythonSystems(micropythonSubsystems, CDirectories, cflagsSoFar):
+def BuildMicroPythonSystems(micropythonSubsystems, CDirectories, cflagsSoFar, pool):
     '''Compiles all user code for MicroPython Functions'''
     if micropythonSubsystems:
         g_stageLog.info("Building MicroPython subSystems")
-    for baseDir in micropythonSubsystems.keys():
 
-        mpySource = "$(taste-config --prefix)/../tool-src/upython-taste"
+    def prepareMicroPython(baseDir):
+        mpySource = QueryTool("taste-config", "--prefix") + "/../tool-src/upython-taste"
         mpyTemplDir = mpySource + "/ports/esa-taste"
         os.chdir(baseDir + os.sep + baseDir)
 
@@ -603,19 +1697,18 @@ def BuildMicroPythonSystems(micropythonSubsystems, CDirectories, cflagsSoFar):
             f.write("extern const unsigned int mpy_script_len;\n")
             f.write("extern const unsigned char mpy_script_data[%u];\n" % len(mpy_data))
 
-        # copy the MicroPython source
-        mysystem("for file in %s/py/*.c; do cp $file ./py_$(basename $file); done" % (mpySource,))
+        # copy the MicroPython source, the bindings for this subsystem,
+        # and mpconfigport.h, mphalport.h, and utility code
         mkdirIfMissing("py")
-        mysystem("for file in %s/py/*.h; do cp $file ./py/; done" % (mpySource,))
-
-        # copy the bindings for this subsystem
-        mysystem("for i in ../%s_mpy_bindings.[ch] ; do if [ -f $i ] ; then cp $i ./ ; fi ; done" % (baseDir,))
-
-        # copy/generate mpconfigport.h, mphalport.h, and utility code
-        mysystem("cp %s/mpconfigport_taste_x86.h ./mpconfigport.h" % (mpyTemplDir,))
-        mysystem("cp %s/mphalport_taste_x86.h ./mphalport.h" % (mpyTemplDir,))
-        mysystem("cp %s/mphalport_taste_x86.c ./mphalport.c" % (mpyTemplDir,))
-        mysystem("cp %s/mputil.[ch] ./" % (mpyTemplDir,))
+        StageFiles(
+            ".",
+            sources=["../%s_mpy_bindings.[ch]" % baseDir],
+            required=[(mpySource + "/py/*.c", "py_%s"),
+                      (mpySource + "/py/*.h", "py/%s"),
+                      (mpyTemplDir + "/mpconfigport_taste_x86.h", "mpconfigport.h"),
+                      (mpyTemplDir + "/mphalport_taste_x86.h", "mphalport.h"),
+                      (mpyTemplDir + "/mphalport_taste_x86.c", "mphalport.c"),
+                      mpyTemplDir + "/mputil.[ch]"])
 
         # generate the interned qstrs
         mkdirIfMissing("genhdr")
@@ -629,159 +1722,176 @@ def BuildMicroPythonSystems(micropythonSubsystems, CDirectories, cflagsSoFar):
 
         os.chdir("../..")
 
+    for baseDir in micropythonSubsystems.keys():
         CommonBuildingPart(baseDir, "MicroPython", CDirectories,
-                           cflagsSoFar + " -std=c99 -Wno-switch -Wno-override-init -Wno-jump-misses-init",
+                           cflagsSoFar + " -std=c99 -Wno-switch -Wno-override-init -Wno-jump-misses-init", pool,
                            buildCmd=lambda baseDir, cf:
-                                    mysystem("\"$GNATGCC\" -c %s -Wno-switch-enum -I ../../GlueAndBuild/glue%s/ -I ../../auto-src/ *.c" % (cf, baseDir)))
+                                    CompileSources("\"$GNATGCC\"", "%s -Wno-switch-enum -I ../../GlueAndBuild/glue%s/ -I ../../auto-src/" % (cf, baseDir)),
+                           prepareCmd=lambda baseDir=baseDir: prepareMicroPython(baseDir))
 
 
-def BuildCsystems(cSubsystems, CDirectories, cflagsSoFar):
+def BuildCsystems(cSubsystems, CDirectories, cflagsSoFar, pool):
     '''Compiles all user code for C Functions'''
     if cSubsystems:
         g_stageLog.info("Building C subSystems")
     for baseDir in cSubsystems.keys():
-        CommonBuildingPart(baseDir, "C", CDirectories, cflagsSoFar)
+        CommonBuildingPart(baseDir, "C", CDirectories, cflagsSoFar, pool)
 
 
-def BuildCPPsystems(cppSubsystems, CDirectories, cflagsSoFar):
+def BuildCPPsystems(cppSubsystems, CDirectories, cflagsSoFar, pool):
     '''Compiles all user code for C++ Functions'''
     if cppSubsystems:
         g_stageLog.info("Building C++ subSystems")
 
     def buildCmdCPP(baseDir, cf):
-        mysystem("\"$GNATGXX\" -c %s -I ../../GlueAndBuild/glue%s/ -I ../../auto-src/ *.cc" % (cf, baseDir))
-        mysystem("\"$GNATGCC\" -c %s -I ../../GlueAndBuild/glue%s/ -I ../../auto-src/ *.c" % (cf, baseDir))
+        CompileSources("\"$GNATGXX\"", "%s -I ../../GlueAndBuild/glue%s/ -I ../../auto-src/" % (cf, baseDir), "*.cc")
+        CompileSources("\"$GNATGCC\"", "%s -I ../../GlueAndBuild/glue%s/ -I ../../auto-src/" % (cf, baseDir))
     for baseDir in cppSubsystems.keys():
-        CommonBuildingPart(baseDir, "C++", CDirectories, cflagsSoFar, buildCmdCPP)
+        CommonBuildingPart(baseDir, "C++", CDirectories, cflagsSoFar, pool, buildCmdCPP)
 
 
-def BuildAdaSystems_C_code(adaSubsystems, unused_CDirectories, uniqueSetOfAdaPackages, cflagsSoFar):
+def BuildAdaSystems_C_code(adaSubsystems, unused_CDirectories, uniqueSetOfAdaPackages, cflagsSoFar, pool):
     '''Compiles all C bridge code for Ada Functions (Ada user code compiled via Ocarina Makefiles)'''
     if adaSubsystems:
         g_stageLog.info("Building Ada subSystems")
-    for baseDir in adaSubsystems.keys():
-        if not os.path.isdir(baseDir):
-            panic("No directory %s! (pwd=%s)" % (baseDir, os.getcwd()))
-        if not os.path.isdir(baseDir + os.sep + baseDir):
-            panic("Ada zip file did not contain a %s dir..." % (baseDir))
+
+    def buildSubsystem(baseDir, cflags):
         os.chdir(baseDir + os.sep + baseDir)
-        CheckDirectives(baseDir)
-        mysystem("for i in `/bin/ls ../../GlueAndBuild/glue%s/*.ad? 2>/dev/null | grep -v '/asn1_'` ; do cp \"$i\"  . ; done" % baseDir)
+        glue = "../../GlueAndBuild/glue%s/" % baseDir
         # mysystem("cp ../../GlueAndBuild/glue%s/asn1_types.ads ." % baseDir)
-        mysystem("cp ../../GlueAndBuild/glue%s/adaasn1rtl.ad? . 2>/dev/null ; exit 0" % baseDir)
-        for modulebase in uniqueSetOfAdaPackages.keys():
-            mysystem("cp ../../GlueAndBuild/glue%s/%s.ad? . 2>/dev/null ; exit 0" % (baseDir, modulebase))
-        mysystem("for i in %s_vm_if.c %s_vm_if.h vm_callback.c ; do if [ -f ../$i ] ; then cp ../$i . ; fi ; done" %
-                 (baseDir, baseDir))
-        mysystem("for i in hpredef.h invoke_ri.c vm_callback.h ; do if [ -f ../$i ] ; then cp ../$i . ; fi ; done")
-        mysystem("cp ../*polyorb_interface.h . 2>/dev/null || exit 0")
-        mysystem("rm -f ../dataview.ad[sb] 2>/dev/null || exit 0")
+        StageFiles(
+            ".",
+            sources=[x for x in glob.glob(glue + "*.ad?") if not os.path.basename(x).startswith("asn1_")] +
+            [glue + "adaasn1rtl.ad?"] + [glue + modulebase + ".ad?" for modulebase in uniqueSetOfAdaPackages.keys()] +
+            ["../%s_vm_if.c" % baseDir, "../%s_vm_if.h" % baseDir, "../vm_callback.c",
+             "../hpredef.h", "../invoke_ri.c", "../vm_callback.h", "../*polyorb_interface.h"],
+            remove=["../dataview.ad[sb]"])
         # obsolete: compilation of Ada code is done via Ocarina's makefiles, not by the orchestrator
         # mysystem("\"$GNATGCC\" -g -c *.adb")
         # mysystem("for i in *.ads ; do [ ! -f ${i/.ads/.adb} ] && \"$GNATGCC\" -g -c *.ads || break ; done")
         if (baseDir in g_distributionNodesPlatform.keys()):
             UpdateEnvForNode(baseDir)
-        mysystem("\"$GNATGCC\" -c %s -I ../../GlueAndBuild/glue%s/ -I ../../auto-src/ *.c" %
-                 (cflagsSoFar + CalculateCFLAGS(baseDir) + CalculateUserCodeOnlyCFLAGS(baseDir), baseDir))
+        CompileSources("\"$GNATGCC\"", "%s -I ../../GlueAndBuild/glue%s/ -I ../../auto-src/" %
+                       (cflags, baseDir))
         os.chdir("..")
-        cflags = cflagsSoFar + CalculateCFLAGS(baseDir) + CalculateUserCodeOnlyCFLAGS(baseDir)
-        mysystem("\"$GNATGCC\" -c -I ../GlueAndBuild/glue%s/ -I ../auto-src/ %s *.c" % (baseDir, cflags))
+        CompileSources("\"$GNATGCC\"", "-I ../GlueAndBuild/glue%s/ -I ../auto-src/ %s" % (baseDir, cflags))
         os.chdir("..")
 
+    for baseDir in adaSubsystems.keys():
+        if not os.path.isdir(baseDir):
+            panic("No directory %s! (pwd=%s)" % (baseDir, os.getcwd()))
+        if not os.path.isdir(baseDir + os.sep + baseDir):
+            panic("Ada zip file did not contain a %s dir..." % (baseDir))
+        LearnDirectives(baseDir, baseDir + os.sep + baseDir)
+        cflags = cflagsSoFar + CalculateCFLAGS(baseDir) + CalculateUserCodeOnlyCFLAGS(baseDir)
+        pool.submit(SubsystemJobName("Ada", baseDir), buildSubsystem, baseDir, cflags)
+
 
-def BuildObjectGeodeSystems(ogSubsystems, CDirectories, cflagsSoFar):
+def BuildObjectGeodeSystems(ogSubsystems, CDirectories, cflagsSoFar, pool):
     '''Compiles all user code for ObjectGeode Functions'''
     if ogSubsystems:
         g_stageLog.info("Building ObjectGeode subSystems")
+
+    def buildSubsystem(ss, baseDir, cflags):
+        # This is for ObjectGeode code
+        os.chdir(baseDir + os.sep + "ext")
+        ogTypes = g_absOutputDir + "/GlueAndBuild/glue%s/OG_ASN1_Types.h" % ss
+        if not os.path.isfile(ogTypes):
+            open(ogTypes, 'a').close()
+        StageFiles(
+            ".",
+            sources=["../*polyorb_interface.?", "../Context-*.?"],
+            remove=["../*-uniq.?", "*-uniq.?", "../dataview.[ch]"])
+        if (baseDir in g_distributionNodesPlatform.keys()):
+            UpdateEnvForNode(baseDir)
+        CompileSources("\"$GNATGCC\"", "%s -I \"$WORKDIR/auto-src/\"  -I \"$WORKDIR/GlueAndBuild/glue%s/\"" %
+                       (cflags, ss))
+        os.chdir("../..")
+
     for ss in ogSubsystems.keys():
         base = os.path.basename(ss)
         baseDir = os.path.splitext(base)[0]
         if not os.path.isdir(baseDir + os.sep + "ext"):
             panic("OG subsystems must contain an ext/ directory! (%s)" % str(ss))
-        # This is for ObjectGeode code
-        os.chdir(baseDir + os.sep + "ext")
-        CheckDirectives(baseDir)
-        mysystem("if [ ! -f \"$WORKDIR/GlueAndBuild/glue%s/OG_ASN1_Types.h\" ] ; then touch \"$WORKDIR/GlueAndBuild/glue%s/OG_ASN1_Types.h\" ; fi" % (ss, ss))
-        mysystem("cp ../*polyorb_interface.? . 2>/dev/null || exit 0")
-        mysystem("cp ../Context-*.? . 2>/dev/null || exit 0")
-        mysystem("rm -f ../*-uniq.? *-uniq.? 2>/dev/null || exit 0")
-        mysystem("rm -f ../dataview.[ch] 2>/dev/null || exit 0")
+        LearnDirectives(baseDir, baseDir + os.sep + "ext")
         extraCdirIncludes = " "
         partitionName = g_fromFunctionToPartition[baseDir]
         if partitionName in CDirectories:
             for d in CDirectories[partitionName]:
                 extraCdirIncludes += "-I \"" + d + "\" "
-        if (baseDir in g_distributionNodesPlatform.keys()):
-            UpdateEnvForNode(baseDir)
-        mysystem("for i in *.c ; do \"$GNATGCC\" -c %s -I \"$WORKDIR/auto-src/\"  -I \"$WORKDIR/GlueAndBuild/glue%s/\" \"$i\" || exit 1 ; done" %
-                 (cflagsSoFar + extraCdirIncludes + CalculateCFLAGS(ss) + CalculateUserCodeOnlyCFLAGS(ss), ss))
-        os.chdir("../..")
+        cflags = cflagsSoFar + extraCdirIncludes + CalculateCFLAGS(ss) + CalculateUserCodeOnlyCFLAGS(ss)
+        pool.submit(SubsystemJobName("ObjectGeode", baseDir), buildSubsystem, ss, baseDir, cflags)
 
 
-def BuildRTDSsystems(rtdsSubsystems, CDirectories, cflagsSoFar):
+def BuildRTDSsystems(rtdsSubsystems, CDirectories, cflagsSoFar, pool):
     '''Compiles all user code for PragmaDev Functions'''
     if rtdsSubsystems:
         g_stageLog.info("Building RTDS subSystems")
+
+    def buildSubsystem(baseDir, cflags, extraCdirIncludes):
+        os.chdir(baseDir + os.sep + baseDir)
+        StageFiles(
+            ".",
+            sources=["../" + x for x in ["common.h", "invoke_ri.c", "%s_vm_if.c" % baseDir, "%s_vm_if.h" % baseDir,
+                                         "glue_%s.h" % baseDir, "glue_%s.c" % baseDir, "profile/RTDS_Proc.c",
+                                         "*polyorb_interface.?", "Context-*.?", "*syncRI.c"]],
+            remove=["../*-uniq.?", "*-uniq.?", "../dataview.[ch]"])
+        if (baseDir in g_distributionNodesPlatform.keys()):
+            UpdateEnvForNode(baseDir)
+        CompileSources("\"$GNATGCC\"", "-DRTDS_NO_SCHEDULER %s %s -I ../../GlueAndBuild/glue%s/ -I ../../auto-src/ -I ../profile" %
+                       (cflags, extraCdirIncludes, baseDir))
+        os.chdir("../..")
+
     for baseDir in rtdsSubsystems.keys():
         if not os.path.isdir(baseDir):
             panic("No directory %s! (pwd=%s)" % (baseDir, os.getcwd()))
         if not os.path.isdir(baseDir + os.sep + baseDir):
             panic("RTDS zip file did not contain a %s dir..." % (baseDir))
-        os.chdir(baseDir + os.sep + baseDir)
-        CheckDirectives(baseDir)
-        mysystem("for i in common.h invoke_ri.c %s_vm_if.c %s_vm_if.h glue_%s.h glue_%s.c profile/RTDS_Proc.c ; do if [ -f ../$i ] ; then cp ../$i . ; fi ; done" %
-                 (baseDir, baseDir, baseDir, baseDir))
-        mysystem("cp ../*polyorb_interface.? . 2>/dev/null || exit 0")
-        mysystem("cp ../Context-*.? . 2>/dev/null || exit 0")
-        mysystem("rm -f ../*-uniq.? *-uniq.? 2>/dev/null || exit 0")
-        mysystem("cp ../*syncRI.c . 2>/dev/null || exit 0")
-        mysystem("rm -f ../dataview.[ch] 2>/dev/null || exit 0")
+        LearnDirectives(baseDir, baseDir + os.sep + baseDir)
         extraCdirIncludes = " "
         partitionName = g_fromFunctionToPartition[baseDir]
         if partitionName in CDirectories:
             for d in CDirectories[partitionName]:
                 extraCdirIncludes += "-I \"" + d + "\" "
-        if (baseDir in g_distributionNodesPlatform.keys()):
-            UpdateEnvForNode(baseDir)
-        mysystem("\"$GNATGCC\" -c -DRTDS_NO_SCHEDULER %s %s -I ../../GlueAndBuild/glue%s/ -I ../../auto-src/ -I ../profile *.c" %
-                 (cflagsSoFar + CalculateCFLAGS(baseDir) + CalculateUserCodeOnlyCFLAGS(baseDir), extraCdirIncludes, baseDir))
-        os.chdir("../..")
+        cflags = cflagsSoFar + CalculateCFLAGS(baseDir) + CalculateUserCodeOnlyCFLAGS(baseDir)
+        pool.submit(SubsystemJobName("RTDS", baseDir), buildSubsystem, baseDir, cflags, extraCdirIncludes)
 
 
-def BuildVHDLsystems_C_code(vhdlSubsystems, CDirectories, cflagsSoFar):
+def BuildVHDLsystems_C_code(vhdlSubsystems, CDirectories, cflagsSoFar, pool):
     '''Compiles all C bridge code for VHDL Functions'''
     if vhdlSubsystems:
         g_stageLog.info("Building C code of VHDL subSystems")
+
+    def buildSubsystem(baseDir, cflags, extraCdirIncludes):
+        os.chdir(baseDir)
+        if len([x for x in os.listdir(".") if x.endswith("polyorb_interface.c")])>0:
+            if (baseDir in g_distributionNodesPlatform.keys()):
+                UpdateEnvForNode(baseDir)
+            CompileSources("\"$GNATGCC\"", "%s %s -I ../GlueAndBuild/glue%s/ -I ../auto-src/" %
+                           (cflags, extraCdirIncludes, baseDir))
+        os.chdir("..")
+
     for baseDir in vhdlSubsystems.keys():
         if not os.path.isdir(baseDir):
             panic("No VHDL directory %s! (pwd=%s)" % (baseDir, os.getcwd()))
-        os.chdir(baseDir)
         extraCdirIncludes = ""
         partitionName = g_fromFunctionToPartition[baseDir]
         if partitionName in CDirectories:
             for d in CDirectories[partitionName]:
                 extraCdirIncludes += "-I \"" + d + "\" "
-        if len([x for x in os.listdir(".") if x.endswith("polyorb_interface.c")])>0:
-            if (baseDir in g_distributionNodesPlatform.keys()):
-                UpdateEnvForNode(baseDir)
-            mysystem("\"$GNATGCC\" -c %s %s -I ../GlueAndBuild/glue%s/ -I ../auto-src/ *.c" %
-                     (cflagsSoFar + CalculateCFLAGS(baseDir) + CalculateUserCodeOnlyCFLAGS(baseDir), extraCdirIncludes, baseDir))
-        os.chdir("..")
+        cflags = cflagsSoFar + CalculateCFLAGS(baseDir) + CalculateUserCodeOnlyCFLAGS(baseDir)
+        pool.submit(SubsystemJobName("VHDL", baseDir), buildSubsystem, baseDir, cflags, extraCdirIncludes)
 
 
-def BuildGUIs(guiSubsystems, cflagsSoFar, asn1Grammar):
+def BuildGUIs(guiSubsystems, cflagsSoFar, asn1Grammar, pool):
     '''Builds automatically generated wxWdigets GUIs'''
     if guiSubsystems:
         g_stageLog.info("Building automatically created GUIs")
-    for baseDir in guiSubsystems:
-        if not os.path.isdir(baseDir):
-            panic("No directory %s! (pwd=%s)" % (baseDir, os.getcwd()))
-        # This is for GUI code
-        if not os.path.exists(baseDir + os.sep + baseDir + "_gui_code.c"):
-            panic("GUI generated code did not contain a %s ..." % (baseDir + os.sep + baseDir + "_gui_code.c"))
+
+    def buildSubsystem(baseDir, cflags):
         os.chdir(baseDir)
         mkdirIfMissing("ext")
-        mysystem('for i in * ; do if [ -f "$i" -a ! -e ext/"$i" ] ; then ln -s ../"$i" ext/ ; fi ; done')
+        StageFiles("ext", symlinks=["*"])
         os.chdir("ext")
         partitionNameWithoutSuffix = g_fromFunctionToPartition.get(baseDir, None)
         if partitionNameWithoutSuffix:
@@ -792,48 +1902,57 @@ def BuildGUIs(guiSubsystems, cflagsSoFar, asn1Grammar):
             else:
                 platform = None
             if platform == 'PLATFORM_WIN32':
-                installPath = getSingleLineFromCmdOutput("taste-config --prefix")
+                installPath = QueryTool("taste-config", "--prefix")
                 mysystem("%s/share/gui-udp/build_gui_glue.py %s" % (installPath, baseDir))
-                mysystem('cp "%s"/share/gui-udp/udpcontroller.? .' % installPath)
+                required = [installPath + "/share/gui-udp/udpcontroller.?"]
             else:
-                mysystem("cp \"$DMT\"/AutoGUI/queue_manager.? .")
-        mysystem("cp ../*polyorb_interface.? . 2>/dev/null || exit 0")
-        mysystem("cp ../Context-*.? . 2>/dev/null || exit 0")
-        mysystem("rm -f ../*-uniq.? *-uniq.? 2>/dev/null || exit 0")
+                required = ["$DMT/AutoGUI/queue_manager.?"]
+        else:
+            required = []
+        StageFiles(
+            ".",
+            sources=["../*polyorb_interface.?", "../Context-*.?"], required=required,
+            remove=["../*-uniq.?", "*-uniq.?"])
         if (baseDir in g_distributionNodesPlatform.keys()):
             UpdateEnvForNode(baseDir)
-        mysystem("\"$GNATGCC\" -c %s -I ../../GlueAndBuild/glue%s/ -I ../../auto-src/ *.c" %
-                 (cflagsSoFar + CalculateCFLAGS(baseDir) + CalculateUserCodeOnlyCFLAGS(baseDir), baseDir))
+        CompileSources("\"$GNATGCC\"", "%s -I ../../GlueAndBuild/glue%s/ -I ../../auto-src/" %
+                       (cflags, baseDir))
         os.chdir("..")
         # Now create the controlling GUI application
         mkdirIfMissing("GUI")
-        mysystem('for i in * ; do if [ -f "$i" -a ! -e GUI/"$i" ] ; then ln -s ../"$i" GUI/ ; fi ; done')
+        StageFiles("GUI", symlinks=["*"])
         os.chdir("GUI")
-        mysystem("cp \"$DMT\"/AutoGUI/* .")
-        mysystem("cat Makefile | sed 's,DataView,%s,g' > a_temp_name && mv a_temp_name Makefile" % os.path.splitext(os.path.basename(asn1Grammar))[0])
-        mysystem("cat Makefile | sed 's,applicationName,%s,g' > a_temp_name && mv a_temp_name Makefile" % (baseDir + "_GUI"))
-        mysystem("cp -u ../../GlueAndBuild/glue" + baseDir + "/C_*.[ch] .")
+        # The Makefile is customized for this GUI - so it is only replaced when that changes it
+        autoGUI = os.path.expandvars("$DMT/AutoGUI")
+        StageFiles(
+            ".",
+            required=[x for x in glob.glob(autoGUI + "/*") if os.path.isfile(x) and os.path.basename(x) != "Makefile"] +
+            ["../../GlueAndBuild/glue" + baseDir + "/C_*.[ch]"])
+        makefile = open(autoGUI + "/Makefile").read()
+        makefile = makefile.replace("DataView", os.path.splitext(os.path.basename(asn1Grammar))[0])
+        makefile = makefile.replace("applicationName", baseDir + "_GUI")
+        open("Makefile.staging", 'w').write(makefile)
+        InstallIfChanged("Makefile.staging", "Makefile")
         # mysystem("cp ../auto-src/* .")
-        if baseDir.endswith('probe_console'):
-            os.chdir("../..")
-            continue
         os.chdir("../..")
 
+    for baseDir in guiSubsystems:
+        if not os.path.isdir(baseDir):
+            panic("No directory %s! (pwd=%s)" % (baseDir, os.getcwd()))
+        # This is for GUI code
+        if not os.path.exists(baseDir + os.sep + baseDir + "_gui_code.c"):
+            panic("GUI generated code did not contain a %s ..." % (baseDir + os.sep + baseDir + "_gui_code.c"))
+        cflags = cflagsSoFar + CalculateCFLAGS(baseDir) + CalculateUserCodeOnlyCFLAGS(baseDir)
+        pool.submit(SubsystemJobName("GUI", baseDir), buildSubsystem, baseDir, cflags)
+
 
-def BuildPythonStubs(pythonSubsystems, asn1Grammar, acnFile):
+def BuildPythonStubs(pythonSubsystems, asn1Grammar, acnFile, pool):
     '''Builds automatically generated Python stubs'''
     if pythonSubsystems:
         g_stageLog.info("Building automatically created Python stubs")
-    for baseDir in pythonSubsystems:
-        if not os.path.isdir(baseDir):
-            panic("No directory %s! (pwd=%s)" % (baseDir, os.getcwd()))
+
+    def buildSubsystem(baseDir, FVname):
         olddir = os.getcwd()
-        pattern = re.compile(r'.*?glue([^/]*)')
-        findFV = re.match(pattern, baseDir)
-        if findFV:
-            FVname = findFV.group(1)
-        else:
-            panic("Could not detect FVname out of '%s'" % baseDir)
         os.chdir(baseDir)
         mysystem("cp \"$DMT\"/AutoGUI/queue_manager.? .")
         mysystem("cp \"$DMT\"/AutoGUI/timeInMS.? .")
@@ -856,7 +1975,7 @@ def BuildPythonStubs(pythonSubsystems, asn1Grammar, acnFile):
             else:
                 platform = None
             if platform == 'PLATFORM_WIN32':
-                installPath = getSingleLineFromCmdOutput("taste-config --prefix")
+                installPath = QueryTool("taste-config", "--prefix")
                 mysystem('cp "%s"/share/gui-udp/Makefile.python .' % installPath)
         mysystem("cp \"%s\"/%s/interface_enum.h ." % (g_absOutputDir, FVname))
         mysystem("make -f Makefile.python")
@@ -871,23 +1990,91 @@ def BuildPythonStubs(pythonSubsystems, asn1Grammar, acnFile):
         mysystem("gcc -g -shared -o PythonAccess.so gui_api.o queue_manager.o timeInMS.o debug_messages.o `python-config --ldflags` -lrt")
         os.chdir(olddir)
 
+    for baseDir in pythonSubsystems:
+        if not os.path.isdir(baseDir):
+            panic("No directory %s! (pwd=%s)" % (baseDir, os.getcwd()))
+        pattern = re.compile(r'.*?glue([^/]*)')
+        findFV = re.match(pattern, baseDir)
+        if findFV:
+            FVname = findFV.group(1)
+        else:
+            panic("Could not detect FVname out of '%s'" % baseDir)
+        pool.submit(SubsystemJobName("Python", baseDir), buildSubsystem, baseDir, FVname)
 
-def BuildCyclicSubsystems(cyclicSubsystems, cflagsSoFar):
+
+def BuildCyclicSubsystems(cyclicSubsystems, cflagsSoFar, pool):
     '''Compiles code of Cyclic Functions'''
     if cyclicSubsystems:
         g_stageLog.info("Building cyclic subSystems")
-    for baseDir in cyclicSubsystems:
-        if not os.path.isdir(baseDir):
-            panic("No directory %s! (pwd=%s)" % (baseDir, os.getcwd()))
+
+    def buildSubsystem(baseDir, cflags):
         # This is for automatically generated Cyclic code
         os.chdir(baseDir + os.sep)
         if (baseDir in g_distributionNodesPlatform.keys()):
             UpdateEnvForNode(baseDir)
         if 0 != len([x for x in os.listdir(".") if x.endswith(".c")]):
-            mysystem("\"$GNATGCC\" -c %s -I ../GlueAndBuild/glue%s/ -I ../auto-src/ *.c" %
-                     (cflagsSoFar + CalculateCFLAGS(baseDir) + CalculateUserCodeOnlyCFLAGS(baseDir), baseDir))
+            CompileSources("\"$GNATGCC\"", "%s -I ../GlueAndBuild/glue%s/ -I ../auto-src/" %
+                           (cflags, baseDir))
         os.chdir("..")
 
+    for baseDir in cyclicSubsystems:
+        if not os.path.isdir(baseDir):
+            panic("No directory %s! (pwd=%s)" % (baseDir, os.getcwd()))
+        cflags = cflagsSoFar + CalculateCFLAGS(baseDir) + CalculateUserCodeOnlyCFLAGS(baseDir)
+        pool.submit(SubsystemJobName("Cyclic", baseDir), buildSubsystem, baseDir, cflags)
+
+
+def CopyGlueObjects(glueDir, folder):
+    '''Copies the glue objects next to the objects of the user code - unless they are already there
+
+    They are copied (not moved), so the glue builds can tell that they are up to date.
+    The glue objects that an earlier build copied, but this one did not produce, are removed.'''
+    names = set(os.path.basename(x) for x in glob.glob(glueDir + os.sep + "*.o"))
+    if os.path.isfile(g_absOutputDir + os.sep + "auto-src" + os.sep + "C_ASN1_Types.c"):
+        # The ASN.1 archive provides it (and InvokeOcarinaMakefiles would remove the copy anyway)
+        names.discard("C_ASN1_Types.o")
+    folderKey = os.path.abspath(folder)
+    for name in (g_buildState.get("glueObjects", folderKey) or "").split():
+        if name not in names:
+            for x in (folder + os.sep + name, folder + os.sep + name + ".unpatched"):
+                if os.path.isfile(x):
+                    os.unlink(x)
+    for name in sorted(names):
+        src, dest = glueDir + os.sep + name, folder + os.sep + name
+        built = dest + ".unpatched" if os.path.isfile(dest + ".unpatched") else dest
+        if os.path.isfile(dest) and filecmp.cmp(src, built, shallow=False):
+            continue
+        shutil.copy2(src, dest + ".copying")
+        os.rename(dest + ".copying", dest)
+    g_buildState.update("glueObjects", {folderKey: " ".join(sorted(names))})
+
+
+def PatchObjects(folders, prefix, cmd):
+    '''Renames the common symbols of the objects in the folders, via patchAPLCs.py (the cmd)
+
+    patchAPLCs.py patches the objects in place - and patching an object twice would
+    rename its symbols twice. So each object is first kept (hard-linked) as
+    <object>.unpatched, and the next build starts from that one - unless the object was
+    rebuilt since. If no object changed since they were patched, nothing is done.'''
+    objects = sorted(set(os.path.abspath(x) for f in folders for x in glob.glob(f + os.sep + "*.o")))
+    state = lambda: "\n".join("%s\t%s" % (x, FileStatKey(os.stat(x))) for x in objects)
+    recorded = g_buildState.get("patchedObjects", prefix)
+    if recorded == state():
+        print "No need to rename the symbols in", ", ".join(folders)
+        sys.stdout.flush()
+        return
+    patched = dict(line.split("\t", 1) for line in (recorded or "").split("\n") if "\t" in line)
+    for x in objects:
+        if os.path.isfile(x + ".unpatched"):
+            if patched.get(x) == FileStatKey(os.stat(x)):
+                # Not rebuilt since it was patched
+                os.rename(x + ".unpatched", x)
+            else:
+                os.unlink(x + ".unpatched")
+        os.link(x, x + ".unpatched")
+    mysystem(cmd)
+    g_buildState.update("patchedObjects", {prefix: state()})
+
 
 def RenameCommonlyNamedSymbols(scadeSubsystems, simulinkSubsystems, micropythonSubsystems, cSubsystems, cppSubsystems, adaSubsystems, rtdsSubsystems, ogSubsystems, guiSubsystems, cyclicSubsystems, vhdlSubsystems):
     '''Identifies and renames identical symbols in separate subsystems'''
@@ -910,12 +2097,12 @@ def RenameCommonlyNamedSymbols(scadeSubsystems, simulinkSubsystems, micropythonS
         systemPlatform, pref = g_distributionNodesPlatform[baseDir]
         prefixes[pref] = systemPlatform
         appendTarget = getTarget(baseDir)
-        if 0 != len([x for x in os.listdir("GlueAndBuild/glue" + baseDir) if x.endswith(".o")]):
-            mysystem("mv GlueAndBuild/glue" + baseDir + "/*.o " + baseDir + appendTarget)
+        CopyGlueObjects("GlueAndBuild/glue" + baseDir, baseDir + appendTarget)
 
-    for prefix, systemPlatform in prefixes.items():
+    for prefix in prefixes.keys():
         renamingDirs = 0
         cmd = "patchAPLCs.py "
+        folders = []
         for baseDir in scadeSubsystems.keys() + simulinkSubsystems.keys() + micropythonSubsystems.keys() + cSubsystems.keys() + cppSubsystems.keys() + \
                 adaSubsystems.keys() + rtdsSubsystems.keys() + ogSubsystems.keys() + \
                 guiSubsystems + cyclicSubsystems + vhdlSubsystems.keys():
@@ -923,6 +2110,7 @@ def RenameCommonlyNamedSymbols(scadeSubsystems, simulinkSubsystems, micropythonS
             if pref != prefix:
                 continue
             appendTarget = getTarget(baseDir)
+            folders.append(baseDir + appendTarget)
             cmd += ' "' + baseDir + appendTarget + '"'
             cmd += ' "' + baseDir.replace(' ', '_') + '_renamed"'
             renamingDirs += 1
@@ -931,12 +2119,89 @@ def RenameCommonlyNamedSymbols(scadeSubsystems, simulinkSubsystems, micropythonS
                 cmd += ' "' + baseDir.replace(' ', '_') + '"'
                 renamingDirs += 1
         if renamingDirs > 1:
-            os.putenv("OBJCOPY", prefix + "objcopy")
-            asn1SccFolder = "auto-src_" + systemPlatform
-            if os.path.isdir(asn1SccFolder):
-                cmd += ' ' + asn1SccFolder + "/"
-                cmd += ' ' + asn1SccFolder
-            mysystem(cmd)
+            os.environ["OBJCOPY"] = prefix + "objcopy"
+            PatchObjects(folders, prefix, cmd)
+
+
+def BuildASN1Archive(node, cflags):
+    '''Compiles the ASN.1 runtime and types (auto-src) into a static archive, and returns its path
+
+    The archive is built with the compiler of the node's platform and the given CFLAGS - and
+    is shared by all the nodes that use the same ones. Linking against it (instead of against
+    all the objects) only pulls in the encoders/decoders that each partition actually uses.'''
+    platform, prefix = g_distributionNodesPlatform[node]
+    flavour = hashlib.md5(os.path.expandvars("$GNATGCC") + "\0" + cflags).hexdigest()[:8]
+    folder = g_absOutputDir + os.sep + "auto-src_" + platform + "_" + flavour
+    archive = folder + os.sep + "libasn1.a"
+    mkdirIfMissing(folder)
+    # Partitions that are built concurrently may need the same archive
+    lockFile = open(folder + ".lock", 'w')
+    fcntl.flock(lockFile, fcntl.LOCK_EX)
+    olddir = os.getcwd()
+    try:
+        sources = glob.glob(g_absOutputDir + os.sep + "auto-src" + os.sep + "*.[ch]")
+        names = set(os.path.basename(x) for x in sources)
+        for x in os.listdir(folder):
+            if (x.endswith(".c") or x.endswith(".h")) and x not in names or \
+                    x.endswith(".o") and x[:-2] + ".c" not in names:
+                os.unlink(folder + os.sep + x)
+        for src in sources:
+            dest = folder + os.sep + os.path.basename(src)
+            if not os.path.isfile(dest) or not filecmp.cmp(src, dest, shallow=False):
+                shutil.copy2(src, dest)
+        os.chdir(folder)
+        # Objects that are up to date are not recompiled
+        CompileSources("\"$GNATGCC\"", cflags)
+        objects = sorted(glob.glob("*.o"))
+        members = []
+        if os.path.isfile(archive):
+            members = os.popen('"%sar" t libasn1.a 2>/dev/null' % prefix).read().split()
+        if members != objects or any(os.path.getmtime(x) > os.path.getmtime(archive) for x in objects):
+            if os.path.isfile(archive):
+                os.unlink(archive)
+            mysystem('"%sar" rcs libasn1.a %s' % (prefix, " ".join(objects)))
+        else:
+            print "No need to rebuild", archive
+            sys.stdout.flush()
+    finally:
+        os.chdir(olddir)
+        fcntl.flock(lockFile, fcntl.LOCK_UN)
+        lockFile.close()
+    return archive
+
+
+def LinkFingerprint(root, makeCmd, adaFolders=()):
+    '''Returns a hash of everything that the build of a node depends on - or None, if that's not known
+
+    That is, the Ocarina-generated code of the node (the folder of its Makefile),
+    the make command line (i.e. EXTERNAL_OBJECTS, USER_CFLAGS, USER_LDFLAGS),
+    the contents of all the objects and libraries that it refers to, the Ada
+    sources in the adaFolders (which gnatmake finds via ADA_INCLUDE_PATH), and
+    the environment of the compilers.'''
+    generated = g_buildState.get("ocarinaOutput", os.path.abspath(root))
+    if generated is None:
+        return None
+    fingerprint = hashlib.md5(generated + "\0" + makeCmd)
+    for var in ["GNATGCC", "GNATGXX", "GNATMAKE", "GNATBIND", "GNATLINK", "RTEMS_MAKEFILE_PATH", "USE_GPROF"]:
+        fingerprint.update("\0%s=%s" % (var, os.getenv(var, "")))
+    ocarina = FindInPath("ocarina")
+    if ocarina is not None:
+        # The PolyORB-HI runtime comes with it
+        fingerprint.update("\0" + md5hash(ocarina))
+    for token in makeCmd.replace('"', ' ').split():
+        if token.startswith("-"):
+            continue
+        for path in sorted(glob.glob(token)):
+            if os.path.isfile(path):
+                fingerprint.update("\0" + path + "\0" + md5hash(path))
+    for folder in adaFolders:
+        if not os.path.isdir(folder):
+            continue
+        for name in sorted(os.listdir(folder)):
+            path = os.path.join(folder, name)
+            if os.path.splitext(name)[1].lower() in (".ads", ".adb", ".ada") and os.path.isfile(path):
+                fingerprint.update("\0" + path + "\0" + md5hash(path))
+    return fingerprint.hexdigest()
 
 
 def InvokeOcarinaMakefiles(
@@ -944,10 +2209,32 @@ def InvokeOcarinaMakefiles(
         cflagsSoFar, CDirectories, AdaDirectories, AdaIncludePath, ExtraLibraries,
         bDebug, bUseEmptyInitializers, bCoverage, bProfiling):
 
-    '''Invokes Makefiles generated by Ocarina - generates final executable code'''
+    '''Invokes Makefiles generated by Ocarina - generates final executable code
+
+    With --parallel-partitions, independent partitions are built concurrently,
+    each one in a forked job (i.e. with its own environment and working folder).'''
     g_stageLog.info("Invoking Ocarina generated Makefiles")
     os.chdir(g_absOutputDir)
     os.chdir("GlueAndBuild")
+    glueAndBuildDir = os.getcwd()
+
+    driversConfigPath = os.path.abspath("../DriversConfig/")
+    if os.path.exists(driversConfigPath):
+        driversConfigs = os.listdir(driversConfigPath)
+        for dC in driversConfigs:
+            if AdaIncludePath is None:
+                AdaIncludePath = driversConfigPath + "/" + dC
+            else:
+                AdaIncludePath += ":" + driversConfigPath + "/" + dC
+
+    # Nodes of the same partition (mypartition_obj1, mypartition_obj2, ...) share
+    # the partition's extra C code folders - so they are built in the same job,
+    # one after the other. In the dictionary, the nodes are stored with the
+    # folder of their Makefile, e.g.
+    #
+    # { 'mypartition' : [ ('./mypartition_obj1', 'mypartition_obj1') ] }
+    partitions = []
+    nodesOfPartition = {}
     for root, _, files in os.walk("."):
         for _ in [x for x in files if x.lower() == "makefile"]:
             # Learn the name of the AADL system
@@ -961,8 +2248,14 @@ def InvokeOcarinaMakefiles(
                 continue
             if node not in g_distributionNodes:
                 panic("There is no '%s' node in the distribution nodes generated by buildsupport." % node)
-
             partitionNameWithoutSuffix = re.sub(r'_obj\d+$', '', node)
+            if partitionNameWithoutSuffix not in nodesOfPartition:
+                partitions.append(partitionNameWithoutSuffix)
+            nodesOfPartition.setdefault(partitionNameWithoutSuffix, []).append((root, node))
+
+    def buildPartition(partitionNameWithoutSuffix):
+        for root, node in nodesOfPartition[partitionNameWithoutSuffix]:
+            os.chdir(glueAndBuildDir)
 
             # Create the EXTERNAL_OBJECTS line
             externals = ""
@@ -985,12 +2278,12 @@ def InvokeOcarinaMakefiles(
             # In either case, setup profiling:
             if nodeIsGPROFed:
                 userCFlags += " -D__PO_HI_USE_GPROF "
-                os.putenv("USE_GPROF", "1")
+                os.environ["USE_GPROF"] = "1"
                 if g_distributionNodesPlatform[node][0].startswith("PLATFORM_LEON_RTEMS"):
                     userCFlags += " -I " + os.getenv("RTEMS_MAKEFILE_PATH_LEON") + "/lib/include/ "
             else:
                 # Otherwise disable it
-                os.unsetenv("USE_GPROF")
+                os.environ.pop("USE_GPROF", None)
             # If global ("--gprof") profiling is set, add "-pg" to CFLAGS and LDFLAGS
             if bProfiling:
                 userCFlags += " -pg "
@@ -1009,21 +2302,17 @@ def InvokeOcarinaMakefiles(
                         break
 
             os.chdir("..")
-            asn1target = "auto-src_" + g_distributionNodesPlatform[node][0]
-            asn1target = os.path.abspath(asn1target)
+            asn1Archive = BuildASN1Archive(node, cflagsSoFar + CalculateCFLAGS(node) + CalculateUserCodeOnlyCFLAGS(node))
             poHiAdaLinkCmd = ""
-            poHiAdaLinkLibs = ""
-            # in case of rebuilds
-            mysystem("rm -rf \"%s\" 2>/dev/null ; exit 0" % asn1target)
-            if not os.path.exists(asn1target):
-                os.mkdir(asn1target)
-                os.chdir(asn1target)
-                mysystem("cp ../auto-src/*.[ch] .")
-                mysystem("\"$GNATGCC\" -c %s *.c" % (cflagsSoFar + CalculateCFLAGS(node) + CalculateUserCodeOnlyCFLAGS(node)))
-                os.chdir("..")
+            # The libraries passed via LD_LIBS (see below)
+            ldLibs = []
 
             if bNeedAdaBuildWorkaround:
-                os.chdir(asn1target)
+                adaTarget = os.path.abspath("ada-start_" + node)
+                # in case of rebuilds
+                mysystem("rm -rf \"%s\" 2>/dev/null ; exit 0" % adaTarget)
+                os.mkdir(adaTarget)
+                os.chdir(adaTarget)
                 for baseDir, ss in adaSubsystems.items():
                     if baseDir not in g_distributionNodes[node]:
                         continue
@@ -1057,11 +2346,11 @@ def InvokeOcarinaMakefiles(
                 # Patch from Jerome, after latest updates in POHI:
                 # RTEMS builds expect user-provided libraries to be provided through the LD_LIBS macro,
                 # other PolyORB-HI/C can use directly USER_LDFLAGS
-                poHiAdaLinkLibs += " LD_LIBS=\"-lgnat -lgnarl\" "
+                ldLibs += ["-lgnat", "-lgnarl"]
 
                 os.chdir("..")
+                externals += adaTarget + '/*.o '
 
-            externals += asn1target + '/*.o '
             if g_distributionNodesPlatform[node][0] in ("PLATFORM_LINUX32",):  # and platform.architecture()[0] == '64bit':
                 userCFlags += ' -m32 '
                 userLDFlags += ' -m32 '
@@ -1111,9 +2400,9 @@ def InvokeOcarinaMakefiles(
                         os.chdir(extraCdir)
                         # banner("You use AADLv2 and external code, I don't know what flags to compile it with!!!")
                         if bUseEmptyInitializers:
-                            mysystem("\"$GNATGCC\" %s -c -DEMPTY_LOCAL_INIT *.c" % (CalculateCFLAGS(node) + CalculateUserCodeOnlyCFLAGS(node)))
+                            CompileSources("\"$GNATGCC\"", "%s -DEMPTY_LOCAL_INIT" % (CalculateCFLAGS(node) + CalculateUserCodeOnlyCFLAGS(node)))
                         else:
-                            mysystem("\"$GNATGCC\" %s -c *.c" % (CalculateCFLAGS(node) + CalculateUserCodeOnlyCFLAGS(node)))
+                            CompileSources("\"$GNATGCC\"", CalculateCFLAGS(node) + CalculateUserCodeOnlyCFLAGS(node))
                         os.chdir(pwd)
 
             if partitionNameWithoutSuffix in CDirectories:
@@ -1148,34 +2437,31 @@ def InvokeOcarinaMakefiles(
                 userLDFlags += poHiAdaLinkCmd
 
             # mysystem("cd '"+root+"' && cp ../../../*/*_sync.ads .")
-            driversConfigPath = os.path.abspath("../DriversConfig/")
-            if os.path.exists(driversConfigPath):
-                driversConfigs = os.listdir(driversConfigPath)
-                for dC in driversConfigs:
-                    if AdaIncludePath is None:
-                        AdaIncludePath = driversConfigPath + "/" + dC
-                    else:
-                        AdaIncludePath += ":" + driversConfigPath + "/" + dC
-
             if AdaIncludePath is None:
                 cmd = "cd '" + root + "' && %s EXTERNAL_OBJECTS=\""
             else:
                 cmd = "cd '" + root + "' && ADA_INCLUDE_PATH=\"" + AdaIncludePath + "\" %s EXTERNAL_OBJECTS=\""
-            # Just before invoking ocarina-generated Makefiles, make sure that only one C_ASN1_Types.o is used:
-            externalFiles = ' '.join(x for x in externals.split(' ') if not x.startswith("-"))
-            os.system("rm -f `/bin/ls %s | grep C_ASN1_Types.o | sed 1d` ; exit 0" % externalFiles)
+            # Just before invoking ocarina-generated Makefiles, make sure that only one C_ASN1_Types.o is used
+            # (the one in the ASN.1 archive, if it has one)
+            typesObjects = sorted(
+                y for x in externals.split(' ') if not x.startswith("-")
+                for y in glob.glob(x) if os.path.basename(y) == "C_ASN1_Types.o")
+            if not os.path.exists(os.path.dirname(asn1Archive) + os.sep + "C_ASN1_Types.o"):
+                typesObjects = typesObjects[1:]
+            for x in typesObjects:
+                os.unlink(x)
 
             extra = ""
 
             platformType = g_distributionNodesPlatform[node][0]
             if platformType.startswith("PLATFORM_X86_RTEMS"):
-                os.putenv("RTEMS_MAKEFILE_PATH", os.environ["RTEMS_MAKEFILE_PATH_X86"])
+                os.environ["RTEMS_MAKEFILE_PATH"] = os.environ["RTEMS_MAKEFILE_PATH_X86"]
             elif platformType.startswith("PLATFORM_LEON_RTEMS"):
-                os.putenv("RTEMS_MAKEFILE_PATH", os.environ["RTEMS_MAKEFILE_PATH_LEON"])
+                os.environ["RTEMS_MAKEFILE_PATH"] = os.environ["RTEMS_MAKEFILE_PATH_LEON"]
             elif platformType.startswith("PLATFORM_NDS_RTEMS"):
-                os.putenv("RTEMS_MAKEFILE_PATH", os.environ["RTEMS_MAKEFILE_PATH_NDS"])
+                os.environ["RTEMS_MAKEFILE_PATH"] = os.environ["RTEMS_MAKEFILE_PATH_NDS"]
             elif platformType.startswith("PLATFORM_GUMSTIX_RTEMS"):
-                os.putenv("RTEMS_MAKEFILE_PATH", os.environ["RTEMS_MAKEFILE_PATH_GUMSTIX"])
+                os.environ["RTEMS_MAKEFILE_PATH"] = os.environ["RTEMS_MAKEFILE_PATH_GUMSTIX"]
             if all(x not in platformType for x in ["LEON", "RTEMS", "WIN32", "GNAT_RUNTIME"]):
                 extra += "-lrt "
             if "GNAT_RUNTIME" not in platformType:
@@ -1205,6 +2491,13 @@ def InvokeOcarinaMakefiles(
             if userLDFlags != "":
                 userLDFlags = ' ' + userLDFlags
 
+            # The ASN.1 archive goes with the libraries, after all the objects that use it
+            # (for RTEMS, that means in LD_LIBS - see the patch from Jerome above)
+            if "RTEMS" in platformType:
+                ldLibs.insert(0, asn1Archive)
+            else:
+                userLDFlags += " " + asn1Archive + " "
+
             if len(cppSubsystems)>0:
                 userLDFlags += " -lstdc++ "
 
@@ -1228,7 +2521,27 @@ def InvokeOcarinaMakefiles(
                 userCFlags = userCFlags.replace("-fshort-double", "")  # Not supported when compiling Ada
                 userLDFlags = userLDFlags.replace("-fshort-double", "")  # Not supported when compiling Ada
             customFlags = (' USER_CFLAGS="${USER_CFLAGS}%s" USER_LDFLAGS="${USER_LDFLAGS}%s"' % (userCFlags, userLDFlags))
-            mysystem((cmd % customFlags) + extra + externals + "\"" + poHiAdaLinkLibs + " make")
+            ldLibsFlag = (" LD_LIBS=\"%s\" " % " ".join(ldLibs)) if ldLibs else ""
+            makeCmd = (cmd % customFlags) + extra + externals + "\"" + ldLibsFlag + " make"
+            adaFolders = (AdaIncludePath or "").split(":") + AdaDirectories.get(partitionNameWithoutSuffix, [])
+            fingerprint = LinkFingerprint(root, makeCmd, adaFolders)
+            binaries = [root + os.sep + node, g_absOutputDir + os.sep + "binaries" + os.sep + node]
+            if fingerprint is not None and any(os.path.isfile(x) for x in binaries) and \
+                    g_buildState.get("linkInputs", node) == fingerprint:
+                print "No need to rebuild", node
+                sys.stdout.flush()
+                continue
+            mysystem(makeCmd)
+            if fingerprint is not None:
+                g_buildState.update("linkInputs", {node: fingerprint})
+
+    pool = JobPool(None if g_bParallelPartitions else 1, kind="partition")
+    for partitionNameWithoutSuffix in partitions:
+        pool.submit("partition '%s'" % partitionNameWithoutSuffix, buildPartition, partitionNameWithoutSuffix)
+    failed = pool.waitAll()
+    if failed:
+        panic("Failed to build:\n\t" + "\n\t".join(failed))
+    os.chdir(glueAndBuildDir)
     return AdaIncludePath
 
 
@@ -1263,10 +2576,16 @@ def GatherAllExecutableOutput(unused_outputDir, pythonSubsystems, vhdlSubsystems
     # g_stageLog.info('-' * 70)
     # Strip binaries:
     if not bDebug:
+        stripped = []
         for n in g_distributionNodesPlatform.keys():
-            if os.path.exists(outputDir + os.sep + "/binaries" + os.sep + n):
-                pref = g_distributionNodesPlatform[n][1]
-                mysystem("%sstrip %s" % (pref, outputDir + os.sep + "/binaries" + os.sep + n))
+            binary = outputDir + os.sep + "binaries" + os.sep + n
+            if os.path.exists(binary):
+                # Don't strip again a binary that was not relinked
+                if g_buildState.get("strippedBinaries", binary) == md5hash(binary):
+                    continue
+                stripped.append((g_distributionNodesPlatform[n][1], binary))
+        mysystems("%sstrip %s" % (pref, binary) for pref, binary in stripped)
+        g_buildState.update("strippedBinaries", dict((binary, md5hash(binary)) for _, binary in stripped))
     if bDebug:
         g_stageLog.info("Built with debug info: you can check the stack usage of the binaries")
         g_stageLog.info("with 'checkStackUsage.py', to make sure you are within limits.")
@@ -1291,7 +2610,7 @@ def GatherAllExecutableOutput(unused_outputDir, pythonSubsystems, vhdlSubsystems
     for line in os.popen("find ../.. -type d -name gluetaste_probe_console").readlines():
         line = line.strip()
         mysystem('cp "%s"/python/*.py "%s"/python/*.so .' % (line, line))
-        installPath = getSingleLineFromCmdOutput("taste-config --prefix")
+        installPath = QueryTool("taste-config", "--prefix")
         mysystem('cp "%s"/bin/taste-gnuplot-streams ./driveGnuPlotsStreams.pl' % installPath)
         mysystem('for i in peekpoke.py PeekPoke.glade ; do cp "%s"/share/peekpoke/$i . ; done' % installPath)
         # mysystem('echo Untaring pyinstaller.speedometer.tar.bz2... ; tar jxf "%s"/share/speedometer/pyinstaller.speedometer.tar.bz2' % installPath)
@@ -1358,32 +2677,32 @@ def FixEnvVars():
     '''Updates required environment variables'''
     # DMT tarball is now obsolete - we will use the repos-provided
     # versions of the DMT tools
-    DMTpath = getSingleLineFromCmdOutput("taste-config --prefix") + os.sep + "share"
-    os.putenv("DMT", DMTpath)
+    DMTpath = QueryTool("taste-config", "--prefix") + os.sep + "share"
+    os.environ["DMT"] = DMTpath
 
     # ObjectGeode variables
-    os.putenv("GEODE_MAPPING", "TP")
-    os.putenv("GEODE_MULTI_BIN", "0")
-    os.putenv("GEODE_REMOTE_CREATE", "0")
-    os.putenv("GEODE_NAME_LIMIT", "30")
-    os.putenv("GEODE_LINE_SIZE", "80")
-    os.putenv("GEODE_STR_SIZE", "40")
-    os.putenv("GEODE_ANSI_FUNCTION", "1")
-    os.putenv("GEODE_PRS_HOOK", "0")
-    os.putenv("GEODE_FILE_SIGNAL", "0")
-    os.putenv("GEODE_FILE_PROCED", "0")
-    os.putenv("GEODE_DEC_ONLINE", "0")
-    os.putenv("GEODE_CVISS", "0")
-    os.putenv("GEODE_FIELD_PREFIX", "fd_")
-    os.putenv("GEODE_OUTPUT_FUNCTION", "0")
-    os.putenv("GEODE_OUTPUT_TASK", "0")
-    os.putenv("GEODE_SCHED_MODE", "0")
-    os.putenv("GEODE_C_CHARSTRING", "0")
-    os.putenv("GEODE_NBPAR_NODE", "0")
-    os.putenv("GEODE_NBPAR_GROUP", "0")
-    os.putenv("GEODE_NBPAR_TASK", "0")
-    os.putenv("GEODE_NBPAR_EXTERN", "0")
-    os.putenv("GEODE_NBPAR_PROC", "0")
+    os.environ["GEODE_MAPPING"] = "TP"
+    os.environ["GEODE_MULTI_BIN"] = "0"
+    os.environ["GEODE_REMOTE_CREATE"] = "0"
+    os.environ["GEODE_NAME_LIMIT"] = "30"
+    os.environ["GEODE_LINE_SIZE"] = "80"
+    os.environ["GEODE_STR_SIZE"] = "40"
+    os.environ["GEODE_ANSI_FUNCTION"] = "1"
+    os.environ["GEODE_PRS_HOOK"] = "0"
+    os.environ["GEODE_FILE_SIGNAL"] = "0"
+    os.environ["GEODE_FILE_PROCED"] = "0"
+    os.environ["GEODE_DEC_ONLINE"] = "0"
+    os.environ["GEODE_CVISS"] = "0"
+    os.environ["GEODE_FIELD_PREFIX"] = "fd_"
+    os.environ["GEODE_OUTPUT_FUNCTION"] = "0"
+    os.environ["GEODE_OUTPUT_TASK"] = "0"
+    os.environ["GEODE_SCHED_MODE"] = "0"
+    os.environ["GEODE_C_CHARSTRING"] = "0"
+    os.environ["GEODE_NBPAR_NODE"] = "0"
+    os.environ["GEODE_NBPAR_GROUP"] = "0"
+    os.environ["GEODE_NBPAR_TASK"] = "0"
+    os.environ["GEODE_NBPAR_EXTERN"] = "0"
+    os.environ["GEODE_NBPAR_PROC"] = "0"
 
 
 def ParseCommandLineArgs():
@@ -1401,7 +2720,7 @@ def ParseCommandLineArgs():
     g_stageLog.info("Parsing Command Line Args")
     try:
         args = sys.argv[1:]
-        optlist, args = getopt.gnu_getopt(args, "fgpbrvhjn:o:c:i:S:M:I:C:B:A:G:P:V:QC:QA:e:d:l:w:x:", ['fast', 'debug', 'no-retry', 'with-polyorb-hi-c', 'with-empty-init', 'with-coverage', 'aadlv2', 'gprof', 'keep-case', 'nodeOptions=', 'output=', 'deploymentView=', 'interfaceView=', 'subSCADE=', 'subSIMULINK=', 'subMicroPython=', 'subC=', 'subCPP=', 'subAda=', 'subOG=', 'subRTDS=', 'subVHDL=', 'subQGenC=', 'subQGenAda=', 'with-extra-C-code=', 'with-extra-Ada-code=', 'with-extra-lib=', 'with-cv-attributes', '--timer='])
+        optlist, args = getopt.gnu_getopt(args, "fgpbrvhjn:o:c:i:S:M:I:C:B:A:G:P:V:QC:QA:e:d:l:w:x:", ['fast', 'debug', 'no-retry', 'with-polyorb-hi-c', 'with-empty-init', 'with-coverage', 'aadlv2', 'gprof', 'keep-case', 'nodeOptions=', 'output=', 'deploymentView=', 'interfaceView=', 'subSCADE=', 'subSIMULINK=', 'subMicroPython=', 'subC=', 'subCPP=', 'subAda=', 'subOG=', 'subRTDS=', 'subVHDL=', 'subQGenC=', 'subQGenAda=', 'with-extra-C-code=', 'with-extra-Ada-code=', 'with-extra-lib=', 'with-cv-attributes', '--timer=', 'jobs=', 'parallel-partitions', 'memory-budget=', 'cache-size=', 'cache-dir='])
     except:
         usage()
     if args != []:
@@ -1411,6 +2730,10 @@ def ParseCommandLineArgs():
     g_bFast = g_bPolyORB_HI_C = False
     global g_bRetry
     g_bRetry = True  # set by default
+    global g_maxJobs, g_bParallelPartitions, g_memoryBudget, g_cacheSize, g_cacheDir
+    g_maxJobs = DetermineJobBudget()
+    g_bParallelPartitions = False
+    g_memoryBudget = DetermineMemoryBudget()
     bUseEmptyInitializers = bCoverage = bProfiling = bDebug = bKeepCase = False
 
     # Maxime request: never check for multicores anymore, POHI updates fixed the issues.
@@ -1468,6 +2791,31 @@ def ParseCommandLineArgs():
             cvAttributesFile = arg
         elif opt in ("-x", "--timer"):
             timerResolution = arg
+        elif opt == "--jobs":
+            try:
+                g_maxJobs = int(arg)
+                if g_maxJobs < 1:
+                    raise ValueError()
+            except ValueError:
+                panic("Invalid argument to --jobs (%s) - must be a positive number" % arg)
+        elif opt == "--parallel-partitions":
+            g_bParallelPartitions = True
+        elif opt == "--memory-budget":
+            try:
+                g_memoryBudget = int(arg)
+                if g_memoryBudget < 0:
+                    raise ValueError()
+            except ValueError:
+                panic("Invalid argument to --memory-budget (%s) - must be a number of MB" % arg)
+        elif opt == "--cache-size":
+            try:
+                g_cacheSize = int(arg)
+                if g_cacheSize < 0:
+                    raise ValueError()
+            except ValueError:
+                panic("Invalid argument to --cache-size (%s) - must be a number of MB" % arg)
+        elif opt == "--cache-dir":
+            g_cacheDir = os.path.abspath(arg)
         elif opt in ("-n", "--nodeOptions"):
             subName = arg.split('@')[0]
             onOffLookup = {'on': True, 'off': False}
@@ -1569,7 +2917,7 @@ def ParseCommandLineArgs():
                     AdaIncludePath += ":" + extraADAdir
                 else:
                     AdaIncludePath = extraADAdir
-                os.putenv("ADA_INCLUDE_PATH", AdaIncludePath)
+                os.environ["ADA_INCLUDE_PATH"] = AdaIncludePath
             except:
                 panic("Invalid argument to -d (%s) - must be <deploymentPartition:directoryWithADBfiles>" % arg)
         elif opt in ("-l", "--with-extra-lib"):
@@ -1613,7 +2961,7 @@ disable this check with the -z command line argument or by setting
         if not os.path.exists(f):
             panic("'%s' doesn't exist!" % f)
 
-    os.putenv("ASN1SCC", getSingleLineFromCmdOutput("echo $DMT").strip() + "/asn1scc/asn1.exe")
+    os.environ["ASN1SCC"] = getSingleLineFromCmdOutput("echo $DMT").strip() + "/asn1scc/asn1.exe"
 
     def spawnOcarinaFailed(v):
         return 0 == len(os.popen("ocarina " + v + " 2>&1 | grep ^Ocarina").readlines())
@@ -1621,7 +2969,7 @@ disable this check with the -z command line argument or by setting
         panic("Your PATH has no 'ocarina' !")
 
     # We set LANG to C to avoid issues with LOCALES
-    os.putenv("LANG", "C")
+    os.environ["LANG"] = "C"
 
     for d in [scadeSubsystems, simulinkSubsystems, micropythonSubsystems, cSubsystems, cppSubsystems, adaSubsystems, rtdsSubsystems]:
         for i in d.keys():
@@ -1643,20 +2991,209 @@ disable this check with the -z command line argument or by setting
 
 
 def ReadMD5sums(bDebug):
-    '''Opens the MD5 hashes database (used to avoid working on the same input needlessly)'''
-    md5s = {}
-    md5hashesFilename = "md5hashes" + ("Debug" if bDebug else "")
-    if os.path.exists(md5hashesFilename):
-        for line in open(md5hashesFilename, 'r').readlines():
+    '''Reads the MD5 hashes of the last build (used to avoid working on the same input needlessly)
+
+    Returns them, along with the namespace of the build state store that
+    they must be updated in.'''
+    md5namespace = "md5hashes" + ("Debug" if bDebug else "")
+    # Import the hashes of the text file that older versions used to keep
+    if os.path.exists(md5namespace):
+        md5s = {}
+        for line in open(md5namespace, 'r').readlines():
             md5s[line.split(':')[0]] = line.split(':')[1].strip()
-    return md5s, md5hashesFilename
+        g_buildState.update(md5namespace, md5s)
+        os.unlink(md5namespace)
+    return g_buildState.items(md5namespace), md5namespace
+
+
+def InterfaceViewGrammars(i_aadlFile):
+    '''Returns the ASN.1 and ACN files that the interface view refers to (e.g. in its Source_Text properties)'''
+    grammars = set()
+    baseDir = os.path.dirname(os.path.abspath(i_aadlFile))
+    for name in re.findall(r'"([^"]+\.(?:asn1?|acn))"', open(i_aadlFile).read(), re.I):
+        for candidate in [name, baseDir + os.sep + name]:
+            if os.path.isfile(candidate):
+                grammars.add(os.path.abspath(candidate))
+                break
+    return sorted(grammars)
+
+
+def GeneratorKey(cmd, tools, inputs, outputs=()):
+    '''Returns the key of the output of a code generator command, in the generator cache
+
+    It depends on the command, on the contents of the tools (e.g. "$DMT/asn1scc/asn1.exe",
+    or "msgPrinter" as found in the PATH) and on the contents of the input files. The
+    folders of the inputs and outputs don't matter - so projects (or branches) that
+    generate from the same files can share the cache (see --cache-dir).'''
+    for path in sorted(set(os.path.abspath(x) for x in list(inputs) + list(outputs)), key=len, reverse=True):
+        cmd = cmd.replace(path, os.path.basename(path))
+    key = hashlib.md5("generator\0" + cmd)
+    for tool in tools:
+        path = os.path.expandvars(tool)
+        if os.sep not in path:
+            path = FindInPath(path)
+        key.update("\0" + tool + "\0" + (md5hash(path) if path and os.path.isfile(path) else "missing"))
+    for i in inputs:
+        key.update("\0" + os.path.basename(i) + "\0" + (md5hash(i) if os.path.isfile(i) else "missing"))
+    return key.hexdigest()
+
+
+def GeneratorIsUpToDate(run, key):
+    '''Tells whether the generator run (e.g. its command and folder) already produced its outputs
+    from inputs with the same key - and they are all still there, unchanged'''
+    recorded = g_buildState.get("generatorRuns", run)
+    if recorded is None:
+        return False
+    lines = recorded.split('\n')
+    if lines[0] != key:
+        return False
+    for line in lines[1:]:
+        digest, path = line.split(' ', 1)
+        if not os.path.isfile(path) or md5hash(path) != digest:
+            return False
+    return True
+
+
+def RememberGeneratorRun(run, key, outputs):
+    '''Records the key of the inputs of the generator run, and the outputs (with their hashes) it produced'''
+    g_buildState.update("generatorRuns", {run: '\n'.join(
+        [key] + [md5hash(x) + ' ' + os.path.abspath(x) for x in outputs if os.path.isfile(x)])})
+
+
+def FolderSnapshot(folder):
+    '''Returns the stat keys of the files in the folder (not recursively)'''
+    snapshot = {}
+    for name in os.listdir(folder):
+        st = os.stat(folder + os.sep + name)
+        if not os.path.isdir(folder + os.sep + name):
+            snapshot[name] = FileStatKey(st)
+    return snapshot
+
+
+def InstallIfChanged(src, dest):
+    '''Moves src over dest - unless dest already has the same contents, in which case it keeps its mtime'''
+    if os.path.isfile(dest) and filecmp.cmp(src, dest, shallow=False):
+        os.unlink(src)
+        return
+    makedirsIfMissing(os.path.dirname(os.path.abspath(dest)))
+    os.rename(src, dest)
+
+
+def StageFiles(dest, sources=(), required=(), remove=(), symlinks=()):
+    '''Stages the files that a build step needs into the dest folder - in-process, instead of via cp/rm/ln
+
+    The sources and required are glob patterns (with env vars expanded), or (pattern, name)
+    pairs - where the name may contain a %s, for the name of the original file. Patterns that
+    match no files are skipped, unless they are required. Files that already have the same
+    contents in dest are left untouched (so they keep their mtimes); the others are copied
+    atomically, i.e. via a temporary file. The files matching the remove patterns are then
+    deleted, and symlinks are made in dest to the files matching the symlinks patterns
+    (unless something with the same name is already there).'''
+    for bRequired, patterns in ((False, sources), (True, required)):
+        for pattern in patterns:
+            pattern, name = pattern if isinstance(pattern, tuple) else (pattern, "%s")
+            matches = [x for x in sorted(glob.glob(os.path.expandvars(pattern))) if os.path.isfile(x)]
+            if bRequired and not matches:
+                panic("No files matching '%s' (in %s)" % (pattern, os.getcwd()))
+            for src in matches:
+                target = os.path.join(dest, name % os.path.basename(src) if "%s" in name else name)
+                if os.path.isfile(target) and (os.path.samefile(src, target) or filecmp.cmp(src, target, shallow=False)):
+                    continue
+                shutil.copyfile(src, target + ".staging")
+                shutil.copymode(src, target + ".staging")
+                os.rename(target + ".staging", target)
+    for pattern in remove:
+        for x in glob.glob(os.path.expandvars(pattern)):
+            if os.path.isfile(x) or os.path.islink(x):
+                os.unlink(x)
+    for pattern in symlinks:
+        for src in sorted(glob.glob(os.path.expandvars(pattern))):
+            target = os.path.join(dest, os.path.basename(src))
+            if os.path.isfile(src) and not os.path.lexists(target):
+                os.symlink(os.path.relpath(src, dest), target)
+
+
+def WriteBundle(bundle, folder, names, bNumbered=False):
+    '''Writes the files (paths relative to the folder, or absolute) into a bundle (a zip file)
+
+    If bNumbered, the files are stored by their position in names (and not
+    by their path), so RestoreBundle can extract them under different paths.'''
+    z = zipfile.ZipFile(bundle, 'w', zipfile.ZIP_DEFLATED)
+    for i, x in enumerate(names):
+        z.write(os.path.join(folder, x), str(i) if bNumbered else x)
+    z.close()
+
+
+def RestoreBundle(bundle, folder, names=None):
+    '''Extracts the files of a bundle under the folder - or as the given names, for numbered bundles
+
+    Files that already have the right contents are left untouched, so their mtimes don't trigger any rebuilds.
+    Returns the paths of the files.'''
+    z = zipfile.ZipFile(bundle)
+    restored = []
+    for info in z.infolist():
+        dest = os.path.join(folder, info.filename if names is None else names[int(info.filename)])
+        restored.append(dest)
+        if not os.path.isfile(dest) or os.path.getsize(dest) != info.file_size or FileCRC(dest) != info.CRC:
+            makedirsIfMissing(os.path.dirname(os.path.abspath(dest)))
+            f = open(dest + ".restoring", 'wb')
+            f.write(z.read(info))
+            f.close()
+            os.rename(dest + ".restoring", dest)
+    z.close()
+    return restored
+
+
+def RunCachedGenerator(what, cmd, tools, inputs, outputs=None, folder="."):
+    '''Runs a code generator command - or restores its output from the cache, without launching it
+
+    The output is either the given list of files, or (if None) all the files of the folder
+    that the command created or modified. Nothing is done if the command already produced
+    them (in an earlier build) from the same inputs, and they are unchanged. Otherwise, they
+    are restored from the cache if possible; files that already have the cached contents
+    are left untouched, so their mtimes don't trigger any rebuilds.'''
+    key = GeneratorKey(cmd, tools, inputs, [os.path.join(folder, x) for x in outputs or []])
+    run = os.path.abspath(folder) + "\0" + cmd
+    if GeneratorIsUpToDate(run, key):
+        print "No need to rerun", what
+        sys.stdout.flush()
+        return
+    fd, bundle = tempfile.mkstemp(prefix=".tasteGenerator", suffix=".zip")
+    os.close(fd)
+    try:
+        if g_objectCache is not None and g_objectCache.fetch(key, bundle):
+            RememberGeneratorRun(run, key, RestoreBundle(bundle, folder, outputs))
+            print "No need to rerun", what, "(using its cached output)"
+            sys.stdout.flush()
+            return
+        before = FolderSnapshot(folder) if outputs is None else None
+        mysystem(cmd)
+        if outputs is None:
+            after = FolderSnapshot(folder)
+            produced = sorted(x for x in after if before.get(x) != after[x])
+            if g_objectCache is not None:
+                WriteBundle(bundle, folder, produced)
+        else:
+            produced = outputs
+            if g_objectCache is not None:
+                WriteBundle(bundle, folder, outputs, bNumbered=True)
+        if g_objectCache is not None:
+            g_objectCache.store(key, bundle)
+        RememberGeneratorRun(run, key, [os.path.join(folder, x) for x in produced])
+    finally:
+        os.unlink(bundle)
 
 
-def CreateDataViews(i_aadlFile, asn1Grammar, acnFile, baseASN, md5s, md5hashesFilename):
+def CreateDataViews(i_aadlFile, asn1Grammar, acnFile, baseASN, md5s, md5namespace):
     '''Invokes asn2aadlPlus to create AADL DataViews'''
     g_stageLog.info("Creating AADL dataviews")
+    extractor = "$DMT/asn1scc/taste-extract-asn-from-design.exe"
+    interfaceView = [i_aadlFile] + InterfaceViewGrammars(i_aadlFile)
     # Create a "cropped" version of the input ASN.1 grammar, one without the TASTE directives
-    mysystem("mono \"$DMT/asn1scc/taste-extract-asn-from-design.exe\" -i \"%s\" -k \"%s\" -c \"%s\"" % (i_aadlFile, asn1Grammar, acnFile))
+    RunCachedGenerator(
+        "taste-extract-asn-from-design (cropped grammar)",
+        "mono \"$DMT/asn1scc/taste-extract-asn-from-design.exe\" -i \"%s\" -k \"%s\" -c \"%s\"" % (i_aadlFile, asn1Grammar, acnFile),
+        [extractor], interfaceView, outputs=[asn1Grammar, acnFile])
     mysystem("cp \"" + asn1Grammar + "\" . 2>/dev/null || exit 0")
     mysystem("cp \"" + acnFile + "\" . 2>/dev/null || exit 0")
     if os.path.getsize(acnFile):
@@ -1667,22 +3204,24 @@ def CreateDataViews(i_aadlFile, asn1Grammar, acnFile, baseASN, md5s, md5hashesFi
         oldBaseACN = os.path.basename(acnFile)
         if os.path.exists(oldBaseACN):
             os.unlink(oldBaseACN)
-        mysystem("mono \"$DMT\"/asn1scc/asn1.exe -ACND \"" + baseASN + "\"")
+        RunCachedGenerator(
+            "asn1.exe -ACND", "mono \"$DMT\"/asn1scc/asn1.exe -ACND \"" + baseASN + "\"",
+            ["$DMT/asn1scc/asn1.exe"], [baseASN], outputs=[baseASN.replace(".asn", ".acn")])
         acnFile = os.path.abspath(baseASN.replace(".asn", ".acn"))
 
     # Now create the full (non-cropped) ASN.1 grammar, since the DataView AADL we will create below must include ALL types
     # (i.e. including TASTE-Directives)
-    mysystem("mono \"$DMT/asn1scc/taste-extract-asn-from-design.exe\" -i \"%s\" -j \"%s\"" % (i_aadlFile, asn1Grammar))
+    RunCachedGenerator(
+        "taste-extract-asn-from-design (full grammar)",
+        "mono \"$DMT/asn1scc/taste-extract-asn-from-design.exe\" -i \"%s\" -j \"%s\"" % (i_aadlFile, asn1Grammar),
+        [extractor], interfaceView, outputs=[asn1Grammar])
 
     # Create the DataView AADL
     newGrammar = False
     if asn1Grammar not in md5s or (acnFile not in md5s) or \
             md5s[asn1Grammar]!=md5hash(asn1Grammar) or md5s[acnFile]!=md5hash(acnFile):
         mysystem("asn2aadlPlus -acn \"" + acnFile + "\" \"" + asn1Grammar + "\" D_view.aadl")
-        md = open(g_absOutputDir + os.sep + md5hashesFilename, 'a')
-        md.write("%s:%s\n" % (asn1Grammar, md5hash(asn1Grammar)))
-        md.write("%s:%s\n" % (acnFile, md5hash(acnFile)))
-        md.close()
+        g_buildState.update(md5namespace, {asn1Grammar: md5hash(asn1Grammar), acnFile: md5hash(acnFile)})
         newGrammar = True
     else:
         print "No need to rebuild AADLv1 DataView"
@@ -1691,16 +3230,16 @@ def CreateDataViews(i_aadlFile, asn1Grammar, acnFile, baseASN, md5s, md5hashesFi
     if asn1Grammar + "_aadlv2" not in md5s or (acnFile not in md5s) or \
             md5s[asn1Grammar + "_aadlv2"]!=md5hash(asn1Grammar) or md5s[acnFile]!=md5hash(acnFile):
         mysystem("asn2aadlPlus -aadlv2  -acn \"" + acnFile + "\" \"" + asn1Grammar + "\" D_view_aadlv2.aadl")
-        md = open(g_absOutputDir + os.sep + md5hashesFilename, 'a')
-        md.write("%s:%s\n" % (asn1Grammar + "_aadlv2", md5hash(asn1Grammar)))
-        md.write("%s:%s\n" % (acnFile, md5hash(acnFile)))
-        md.close()
+        g_buildState.update(md5namespace, {asn1Grammar + "_aadlv2": md5hash(asn1Grammar), acnFile: md5hash(acnFile)})
     else:
         print "No need to rebuild AADLv2 DataView"
         sys.stdout.flush()
 
     # And now, re-create the "cropped" version of the input ASN.1 grammar, that everyone else uses
-    mysystem("mono \"$DMT/asn1scc/taste-extract-asn-from-design.exe\" -i \"%s\" -k \"%s\"" % (i_aadlFile, asn1Grammar))
+    RunCachedGenerator(
+        "taste-extract-asn-from-design (cropped grammar)",
+        "mono \"$DMT/asn1scc/taste-extract-asn-from-design.exe\" -i \"%s\" -k \"%s\"" % (i_aadlFile, asn1Grammar),
+        [extractor], interfaceView, outputs=[asn1Grammar])
     return acnFile, newGrammar
 
 
@@ -1719,42 +3258,169 @@ def InvokeASN1Compiler(asn1Grammar, baseASN, acnFile, baseACN, isNewGrammar, bCo
     mysystem('cp "' + acnFile + '" .')
 
     # Invoke compiler
+    asn1scc = "$DMT/asn1scc/asn1.exe"
     if isNewGrammar:
         if bCoverage:
-            mysystem("mono \"$DMT\"/asn1scc/asn1.exe -c -uPER -typePrefix asn1Scc -ACN \"" + baseACN + "\" \"" + baseASN + "\"")
+            RunCachedGenerator(
+                "the ASN.1 compiler",
+                "mono \"$DMT\"/asn1scc/asn1.exe -c -uPER -typePrefix asn1Scc -ACN \"" + baseACN + "\" \"" + baseASN + "\"",
+                [asn1scc], [baseASN, baseACN])
         else:
-            mysystem("mono \"$DMT\"/asn1scc/asn1.exe -c -uPER -typePrefix asn1Scc -ACN \"" + baseACN + "\" \"" + baseASN + "\"")
+            RunCachedGenerator(
+                "the ASN.1 compiler",
+                "mono \"$DMT\"/asn1scc/asn1.exe -c -uPER -typePrefix asn1Scc -ACN \"" + baseACN + "\" \"" + baseASN + "\"",
+                [asn1scc], [baseASN, baseACN])
     else:
         print "No need to reinvoke the ASN.1 compiler"
         sys.stdout.flush()
 
     # Create message printers, for use when displaying inner messages with MSCs
-    mysystem('msgPrinter "' + baseASN + '"')
+    RunCachedGenerator("msgPrinter", 'msgPrinter "' + baseASN + '"', ["msgPrinter", asn1scc], [baseASN])
 
     # Create message printers for ASN.1 variables, for use when sending messages for MSCs
-    mysystem('msgPrinterASN1 "' + baseASN + '"')
+    RunCachedGenerator("msgPrinterASN1", 'msgPrinterASN1 "' + baseASN + '"', ["msgPrinterASN1", asn1scc], [baseASN])
 
     os.chdir('../')
 
 
-def UnzipSCADEcode(scadeSubsystems):
-    '''Unpacks and fixes up SCADE code'''
-    if scadeSubsystems:
-        g_stageLog.info("Unziping SCADE code")
-    for baseDir, ss in scadeSubsystems.items():
+def FileCRC(filename):
+    '''Returns the CRC-32 of the file (as stored in zip files)'''
+    crc = 0
+    f = open(filename, 'rb')
+    for chunk in iter(lambda: f.read(1 << 20), ''):
+        crc = zlib.crc32(chunk, crc)
+    f.close()
+    return crc & 0xffffffff
+
+
+# Members of the user code zip files that are never extracted (matched in lower case):
+# objects, and ASN.1 runtime files that would clash with the ones in auto-src
+g_zipBlacklist = ['*.o', 'xer.c', 'ber.c', 'real.c', 'asn1crt.c', 'and', 'acn.c']
+
+
+# The sources whose objects are kept in the folders of the user code (see RemoveStaleObjects)
+g_sourceExtensions = set([".c", ".cc", ".cpp", ".cxx", ".s", ".S", ".adb", ".ads"])
+
+
+def RemoveStaleObjects(folder):
+    '''Removes the objects in the folder (with the code of a Function) that this build will not produce
+
+    That is, the ones without a source next to them (e.g. left over from sources that were
+    removed from the zip file) - except for the glue objects that are still copied in
+    (see CopyGlueObjects).'''
+    for root, _, files in os.walk(folder):
+        glueObjects = set((g_buildState.get("glueObjects", os.path.abspath(root)) or "").split())
+        stems = set(os.path.splitext(x)[0] for x in files if os.path.splitext(x)[1] in g_sourceExtensions)
+        for x in files:
+            obj = x[:-len(".unpatched")] if x.endswith(".o.unpatched") else x
+            if obj.endswith(".o") and obj[:-2] not in stems and obj not in glueObjects:
+                os.unlink(root + os.sep + x)
+
+
+def UnzipUserCode(zipFilename, baseDir, kind="", extension=None, blacklist=(), bLowercaseAda=False):
+    '''Extracts the zip file with the user code of a Function in the current folder
+
+    Returns False if there was no need to: the zip file is the same as the one
+    extracted (and fixed up) in the last build, and its baseDir is still there.
+    Otherwise, the layout (a baseDir folder, with at least one file with the
+    extension in it) is checked from the zip's central directory, and then the
+    members are streamed out in one pass: blacklisted ones are skipped, the
+    others are written without execute permissions (and Ada files with lower
+    case names, if bLowercaseAda) - and only if their size or CRC differ from
+    those of the files in place, so unchanged sources keep their mtimes.
+    Either way, the objects that this build will not produce are removed.'''
+    if os.path.isdir(baseDir) and \
+            g_buildState.get("unzippedCode", os.path.abspath(baseDir)) == md5hash(zipFilename):
+        print "No need to unzip", zipFilename
+        sys.stdout.flush()
+        RemoveStaleObjects(baseDir)
+        return False
+    prefix = kind + " " if kind else ""
+    try:
+        z = zipfile.ZipFile(zipFilename)
+        members = []
+        for info in z.infolist():
+            name = os.path.normpath(info.filename)
+            if name.startswith(os.sep) or name.split(os.sep)[0] == "..":
+                panic("Zip file '%s' contains a file outside its folder (%s)" % (zipFilename, info.filename))
+            members.append((name, info))
+        if not any(name == baseDir or name.startswith(baseDir + os.sep) for name, _ in members):
+            panic("%sZip file '%s' must contain a directory with the same name as the AADL subsystem name (%s)\n" %
+                  (prefix, zipFilename, baseDir))
+        if extension is not None and not any(
+                os.path.dirname(name) == baseDir and (name.lower() if bLowercaseAda else name).endswith(extension) and not info.filename.endswith('/')
+                for name, info in members):
+            panic("%sZip file '%s' must contain a directory with at least one %s file!\n" % (prefix, zipFilename, extension))
+        for name, info in members:
+            if info.filename.endswith('/'):
+                makedirsIfMissing(name)
+                continue
+            base = os.path.basename(name)
+            if any(fnmatch.fnmatch(base.lower(), x) for x in blacklist):
+                continue
+            if bLowercaseAda and (base.lower().endswith(".adb") or base.lower().endswith(".ads")):
+                name = os.path.join(os.path.dirname(name), base.lower())
+            if os.path.isfile(name) and os.path.getsize(name) == info.file_size and FileCRC(name) == info.CRC:
+                os.chmod(name, os.stat(name).st_mode & ~0111)
+                continue
+            folder = os.path.dirname(name)
+            if folder != "":
+                makedirsIfMissing(folder)
+            tmpName = name + ".unzipping"
+            src = z.open(info)
+            f = open(tmpName, 'wb')
+            shutil.copyfileobj(src, f, 1 << 20)
+            f.close()
+            src.close()
+            os.chmod(tmpName, os.stat(tmpName).st_mode & ~0111)
+            os.rename(tmpName, name)
+        z.close()
+    except (zipfile.BadZipfile, zlib.error) as e:
+        panic("Failed to unzip '%s': %s" % (zipFilename, str(e)))
+    RemoveStaleObjects(baseDir)
+    return True
+
+
+def RememberUnzippedCode(zipFilename, baseDir):
+    '''Records that the zip file was extracted (and fixed up) in baseDir, so the next build can skip it'''
+    g_buildState.update("unzippedCode", {os.path.abspath(baseDir): md5hash(zipFilename)})
+
+
+def UnzipAllUserCode(subsystems, description, kind="", extension=None, blacklist=g_zipBlacklist, bLowercaseAda=False):
+    '''Extracts the zip files of the subsystems ({ baseDir : zipFile }) in parallel - each in its own baseDir folder
+
+    Returns the baseDirs whose zip files were (re-)extracted.'''
+    def unzip(baseDir, ss):
         mkdirIfMissing(baseDir)
         os.chdir(baseDir)
         if not ss.lower().endswith(".zip"):
-            panic("Only .zip files supported for SCADE...")
-        mysystem("unzip -o \"" + ss + "\"")
-        if not os.path.isdir(baseDir):
-            panic("Zip file '%s' must contain a directory with the same name as the AADL subsystem name (%s)\n" % (ss, baseDir))
-        mysystem("find \"%s\"/ ! -type d -exec chmod -x '{}' ';'" % baseDir)
-        mysystem("find \"%s\"/ -exec touch '{}' ';'" % baseDir)
-        mysystem("find \"%s\"/ -type f -iname '*.o' -exec rm -f '{}' ';'" % baseDir)
-        for i in ['xer.c', 'ber.c', 'real.c', 'asn1crt.c', 'and', 'acn.c']:
-            mysystem("find \"%s\"/ -type f -iname %s -exec rm -f '{}' ';'" % (baseDir, i))
+            panic("Only .zip files supported for %s..." % description)
+        bUnzipped = UnzipUserCode(ss, baseDir, kind, extension, blacklist, bLowercaseAda)
         os.chdir("..")
+        return bUnzipped
+
+    pool = JobPool(kind="unzip")
+    for baseDir, ss in subsystems.items():
+        pool.submit(baseDir, unzip, baseDir, ss)
+    unzipped = set()
+    failed = []
+    while pool.busy():
+        outcome = pool.waitOne()
+        if not outcome.success:
+            failed.append(outcome.key)
+        elif outcome.result:
+            unzipped.add(outcome.key)
+    if failed:
+        panic("Failed to unzip the code of:\n\t" + "\n\t".join(failed))
+    return unzipped
+
+
+def UnzipSCADEcode(scadeSubsystems):
+    '''Unpacks and fixes up SCADE code'''
+    if scadeSubsystems:
+        g_stageLog.info("Unziping SCADE code")
+    for baseDir in UnzipAllUserCode(scadeSubsystems, "SCADE"):
+        RememberUnzippedCode(scadeSubsystems[baseDir], baseDir + os.sep + baseDir)
 
 
 def UnzipSimulinkCode(simulinkSubsystems):
@@ -1763,27 +3429,24 @@ def UnzipSimulinkCode(simulinkSubsystems):
         g_stageLog.info("Unziping Simulink code")
     majorSimulinkVersion = "7"
     bUseSimulinkMakefiles = {}
+    unzipped = UnzipAllUserCode(simulinkSubsystems, "SIMULINK")
     for baseDir, ss in simulinkSubsystems.items():
-        mkdirIfMissing(baseDir)
         os.chdir(baseDir)
-        if not ss.lower().endswith(".zip"):
-            panic("Only .zip files supported for SIMULINK...")
-        mysystem("unzip -o \"" + ss + "\"")
-        if not os.path.isdir(baseDir):
-            panic("Zip file '%s' must contain a directory with the same name as the AADL subsystem name (%s)\n" % (ss, baseDir))
-        mysystem("find \"%s\"/ ! -type d -exec chmod -x '{}' ';'" % baseDir)
-        mysystem("find \"%s\"/ -exec touch '{}' ';'" % baseDir)
-        mysystem("find \"%s\"/ -type f -iname '*.o' -exec rm -f '{}' ';'" % baseDir)
-        for i in ['xer.c', 'ber.c', 'real.c', 'asn1crt.c', 'and', 'acn.c']:
-            mysystem("find \"%s\"/ -type f -iname %s -exec rm -f '{}' ';'" % (baseDir, i))
-        # Remove the .c file with the main function
-        for line in os.popen("grep 'main(' */*main.c /dev/null | grep -v directives/ | sed 's,:.*,,'", 'r').readlines():
-            line = line.strip()
-            majorSimulinkVersion = (os.popen('grep R20 "' + line + '"' + " | sed 's,^.*: \([0-9]\).*R20.*$,\\1,'", 'r').readlines())[0].strip()
-            print "Detected Simulink major version:", majorSimulinkVersion
-            sys.stdout.flush()
-            os.unlink(line)
-            break
+        bUnzipped = baseDir in unzipped
+        codeDir = os.path.abspath(baseDir)
+        if bUnzipped:
+            # Remove the .c file with the main function
+            for line in os.popen("grep 'main(' */*main.c /dev/null | grep -v directives/ | sed 's,:.*,,'", 'r').readlines():
+                line = line.strip()
+                majorSimulinkVersion = (os.popen('grep R20 "' + line + '"' + " | sed 's,^.*: \([0-9]\).*R20.*$,\\1,'", 'r').readlines())[0].strip()
+                print "Detected Simulink major version:", majorSimulinkVersion
+                sys.stdout.flush()
+                os.unlink(line)
+                g_buildState.update("simulinkVersion", {codeDir: majorSimulinkVersion})
+                break
+        else:
+            # The .c file with the main function is long gone - use what it said in the last build
+            majorSimulinkVersion = g_buildState.get("simulinkVersion", codeDir) or majorSimulinkVersion
         # Fixup the makefile (if present) and decide whether to use a makefile or not
         makefiles = [x for x in os.listdir(baseDir) if (x.endswith(".mk") and x!="unixtools.mk")]
         pattern1 = re.compile(r'BUILDARGS.*OPTS="([^"]*)"')
@@ -1793,8 +3456,9 @@ def UnzipSimulinkCode(simulinkSubsystems):
         os.chdir(baseDir)
         if len(makefiles)==1:
             bUseSimulinkMakefiles[baseDir] = [True, makefiles[0], ""]
-            shutil.copy(makefiles[0], makefiles[0] + ".original")
-            f = open(makefiles[0], "w")
+            if bUnzipped or not os.path.exists(makefiles[0] + ".original"):
+                shutil.copy(makefiles[0], makefiles[0] + ".original")
+            fixedMakefile = []
             for line in open(makefiles[0] + ".original").readlines():
                 line = re.sub(r'(:.*?)(\w+\.tmw)', '\\1', line)
                 buildargs = re.match(pattern1, line)
@@ -1807,13 +3471,20 @@ def UnzipSimulinkCode(simulinkSubsystems):
                     line = 'include unixtools.mk'
                 if line.startswith("$(OBJS) : $(MAKEFILE)"):
                     line = "$(OBJS) : $(MAKEFILE)\n\nassertBuild: $(OBJS)\n\n"
-                f.write(line.replace('-fPIC', ''))
-            f.close()
+                fixedMakefile.append(line.replace('-fPIC', ''))
+            # The objects depend on the makefile - so only touch it if it really changed
+            fixedMakefile = "".join(fixedMakefile)
+            if open(makefiles[0]).read() != fixedMakefile:
+                f = open(makefiles[0], "w")
+                f.write(fixedMakefile)
+                f.close()
         elif len(makefiles)>1:
             panic("For %s: more than one makefiles inside the package (%s)" % (ss, str(makefiles)))
         else:
             bUseSimulinkMakefiles[baseDir] = [False, "", ""]
         os.chdir("../..")
+        if bUnzipped:
+            RememberUnzippedCode(ss, codeDir)
     return majorSimulinkVersion, bUseSimulinkMakefiles
 
 
@@ -1821,77 +3492,34 @@ def UnzipMicroPythonCode(micropythonSubsystems):
     '''Unpacks and fixes up MicroPython code'''
     if micropythonSubsystems:
         g_stageLog.info("Unziping MicroPython code")
-    for baseDir, ss in micropythonSubsystems.items():
-        mkdirIfMissing(baseDir)
-        os.chdir(baseDir)
-        if not ss.lower().endswith(".zip"):
-            panic("Only .zip files supported for MicroPython code...")
-        mysystem("unzip -o \"" + ss + "\"")
-        if not os.path.isdir(baseDir):
-            panic("Zip file '%s' must contain a directory with the same name as the AADL subsystem name (%s)\n" % (ss, baseDir))
-        mysystem("find \"%s\"/ ! -type d -exec chmod -x '{}' ';'" % baseDir)
-        mysystem("find \"%s\"/ -exec touch '{}' ';'" % baseDir)
-        # which of the following rm's are needed?
-        mysystem("find \"%s\"/ -type f -iname '*.o' -exec rm -f '{}' ';'" % baseDir)
-        for i in ['xer.c', 'ber.c', 'real.c', 'asn1crt.c', 'and', 'acn.c']:
-            mysystem("find \"%s\"/ -type f -iname %s -exec rm -f '{}' ';'" % (baseDir, i))
-        os.chdir("..")
+    for baseDir in UnzipAllUserCode(micropythonSubsystems, "MicroPython code"):
+        RememberUnzippedCode(micropythonSubsystems[baseDir], baseDir + os.sep + baseDir)
 
 
 def UnzipCcode(subsystems, lang='C'):
     '''Unpacks and fixes up C code'''
     if subsystems:
         g_stageLog.info("Unziping %s code" % lang)
-    for baseDir, ss in subsystems.items():
-        mkdirIfMissing(baseDir)
-        os.chdir(baseDir)
-        if not ss.lower().endswith(".zip"):
-            panic("Only .zip files supported for %s code..." % lang)
-        mysystem("unzip -o \"" + ss + "\"")
-        if not os.path.isdir(baseDir):
-            panic("%s Zip file '%s' must contain a directory with the same name as the AADL subsystem name (%s)\n" %
-                  (lang, ss, baseDir))
-        extension = '.c' if lang == 'C' else '.cc'
-        if 0 == len([x for x in os.listdir(baseDir) if x.endswith(extension)]):
-            panic("%s Zip file '%s' must contain a directory with at least one %s file!\n" % (lang, ss, extension))
-        mysystem("find \"%s\"/ ! -type d -exec chmod -x '{}' ';'" % baseDir)
-        mysystem("find \"%s\"/ -exec touch '{}' ';'" % baseDir)
-        mysystem("find \"%s\"/ -type f -iname '*.o' -exec rm -f '{}' ';'" % baseDir)
-        for i in ['xer.c', 'ber.c', 'real.c', 'asn1crt.c', 'and', 'acn.c']:
-            mysystem("find \"%s\"/ -type f -iname %s -exec rm -f '{}' ';'" % (baseDir, i))
-        os.chdir("..")
+    extension = '.c' if lang == 'C' else '.cc'
+    for baseDir in UnzipAllUserCode(subsystems, "%s code" % lang, lang, extension):
+        RememberUnzippedCode(subsystems[baseDir], baseDir + os.sep + baseDir)
 
 
 def UnzipAdaCode(adaSubsystems, AdaIncludePath):
     '''Unpacks and fixes up Ada code'''
     if adaSubsystems:
         g_stageLog.info("Unziping Ada code")
+    # Ada user code must be in lower case filenames - so they are renamed while extracting
+    unzipped = UnzipAllUserCode(adaSubsystems, "Ada code", "Ada", ".adb", ['*.o'], bLowercaseAda=True)
     for baseDir, ss in adaSubsystems.items():
-        mkdirIfMissing(baseDir)
-        os.chdir(baseDir)
-        functionalCodeDir = os.path.abspath(os.getcwd())
-        if not ss.lower().endswith(".zip"):
-            panic("Only .zip files supported for Ada code...")
-        mysystem("unzip -o \"" + ss + "\"")
-        if not os.path.isdir(baseDir):
-            panic("Ada Zip file '%s' must contain a directory with the same name as the AADL subsystem name (%s)\n" % (ss, baseDir))
-        if 0 == len([x for x in os.listdir(baseDir) if x.endswith(".adb")]):
-            panic("Ada Zip file '%s' must contain a directory with at least one .adb file!\n" % ss)
-        for root, _, files in os.walk(baseDir):
-            for name in files:
-                if name.lower().endswith(".adb") or name.lower().endswith(".ads"):
-                    if 0 != len([c for c in name if c.isupper()]):
-                        # panic("Ada user code must be in lower case filenames! (%s)" % name)
-                        os.rename(root + os.sep + name, root + os.sep + name.lower())
-        mysystem("find \"%s\"/ ! -type d -exec chmod -x '{}' ';'" % baseDir)
-        mysystem("find \"%s\"/ -exec touch '{}' ';'" % baseDir)
-        mysystem("find \"%s\"/ -type f -iname '*.o' -exec rm -f '{}' ';'" % baseDir)
+        functionalCodeDir = os.path.abspath(baseDir)
+        if baseDir in unzipped:
+            RememberUnzippedCode(ss, baseDir + os.sep + baseDir)
         if AdaIncludePath is not None:
             AdaIncludePath += ":" + functionalCodeDir + os.sep + baseDir
         else:
             AdaIncludePath = functionalCodeDir + os.sep + baseDir
-        os.putenv("ADA_INCLUDE_PATH", AdaIncludePath)
-        os.chdir("..")
+        os.environ["ADA_INCLUDE_PATH"] = AdaIncludePath
     return AdaIncludePath
 
 
@@ -1899,20 +3527,8 @@ def UnzipRTDS(rtdsSubsystems):
     '''Unpacks and fixes up PragmaDev RTDS code'''
     if rtdsSubsystems:
         g_stageLog.info("Unziping RTDS")
-    for baseDir, ss in rtdsSubsystems.items():
-        mkdirIfMissing(baseDir)
-        os.chdir(baseDir)
-        if not ss.lower().endswith(".zip"):
-            panic("Only .zip files supported for RTDS...")
-        mysystem("unzip -o \"" + ss + "\"")
-        if not os.path.isdir(baseDir):
-            panic("Zip file '%s' must contain a directory with the same name as the AADL subsystem name (%s)\n" % (ss, baseDir))
-        mysystem("find \"%s\"/ ! -type d -exec chmod -x '{}' ';'" % baseDir)
-        mysystem("find \"%s\"/ -exec touch '{}' ';'" % baseDir)
-        mysystem("find \"%s\"/ -type f -iname '*.o' -exec rm -f '{}' ';'" % baseDir)
-        for i in ['xer.c', 'ber.c', 'real.c', 'asn1crt.c', 'and', 'acn.c']:
-            mysystem("find \"%s\"/ -type f -iname %s -exec rm -f '{}' ';'" % (baseDir, i))
-        os.chdir("..")
+    for baseDir in UnzipAllUserCode(rtdsSubsystems, "RTDS"):
+        RememberUnzippedCode(rtdsSubsystems[baseDir], baseDir + os.sep + baseDir)
 
 
 def DetectAdaPackages(adaSubsystems, asn1Grammar):
@@ -1921,7 +3537,16 @@ def DetectAdaPackages(adaSubsystems, asn1Grammar):
         g_stageLog.info("Detecting Ada Packages")
     uniqueSetOfAdaPackages = {"adaasn1rtl": 1}
     if adaSubsystems:
-        for l in os.popen("mono \"$DMT\"/asn1scc/asn1.exe -AdaUses \"%s\"" % asn1Grammar).readlines():
+        # The answer is recorded in the build state, for as long as the compiler and the grammar stay the same
+        cmd = "mono \"$DMT\"/asn1scc/asn1.exe -AdaUses \"%s\"" % asn1Grammar
+        key = GeneratorKey(cmd, ["$DMT/asn1scc/asn1.exe"], [asn1Grammar])
+        recorded = g_buildState.get("generatorAnswers", cmd)
+        if recorded is not None and recorded.split('\t', 1)[0] == key:
+            lines = recorded.split('\t', 1)[1].splitlines()
+        else:
+            lines = os.popen(cmd).readlines()
+            g_buildState.update("generatorAnswers", {cmd: key + '\t' + ''.join(lines)})
+        for l in lines:
             uniqueSetOfAdaPackages[l.split(':')[1].rstrip().lower()]=1
     return uniqueSetOfAdaPackages
 
@@ -1930,7 +3555,7 @@ def InvokeBuildSupport(i_aadlFile, depl_aadlFile, bKeepCase, bDebug, cvAttribute
     '''Invokes the buildsupport code generator that creates the PI/RI bridges'''
     g_stageLog.info("Invoking BuildSupport")
     caseHandling = " --keep-case " if bKeepCase else ""
-    installPath = getSingleLineFromCmdOutput("taste-config --prefix")
+    installPath = QueryTool("taste-config", "--prefix")
     ellidissLibs = ("{inst}/share/config_ellidiss/TASTE_IV_Properties.aadl"
                     " {inst}/share/config_ellidiss/TASTE_DV_Properties.aadl"
                     .format(inst=installPath))
@@ -1942,27 +3567,74 @@ def InvokeBuildSupport(i_aadlFile, depl_aadlFile, bKeepCase, bDebug, cvAttribute
     if not any('Taste::version' in x for x in open(depl_aadlFile).readlines()):
         converterFlag = " --future "
     timerOption = " -x " + timerResolution + " "
+    components = QueryTool("ocarina-config", "--resources") + "/AADLv2/ocarina_components.aadl"
     if g_bPolyORB_HI_C:
-        mysystem('"buildsupport" ' + timerOption + converterFlag + dbgOption + caseHandling + ' --gw --glue -i "' + i_aadlFile + '" ' + ' -c "' + os.path.basename(depl_aadlFile) + '" $(ocarina-config --resources)/AADLv2/ocarina_components.aadl ' + " -d " + dv + " --polyorb-hi-c --smp2 " + ellidissLibs)
+        cmd = '"buildsupport" ' + timerOption + converterFlag + dbgOption + caseHandling + ' --gw --glue -i "' + i_aadlFile + '" ' + ' -c "' + os.path.basename(depl_aadlFile) + '" ' + components + ' ' + " -d " + dv + " --polyorb-hi-c --smp2 " + ellidissLibs
     else:
-        mysystem('"buildsupport" ' + timerOption + converterFlag + dbgOption + caseHandling + ' --gw --glue -i "' + i_aadlFile + '" ' + ' -c "' + os.path.basename(depl_aadlFile) + '" $(ocarina-config --resources)/AADLv2/ocarina_components.aadl ' + " -d " + dv + " --smp2 " + ellidissLibs)
+        cmd = '"buildsupport" ' + timerOption + converterFlag + dbgOption + caseHandling + ' --gw --glue -i "' + i_aadlFile + '" ' + ' -c "' + os.path.basename(depl_aadlFile) + '" ' + components + ' ' + " -d " + dv + " --smp2 " + ellidissLibs
+    cvCmd = None
+    tools = ["buildsupport"]
     if cvAttributesFile.endswith("ConcurrencyView.pro"):
         # Legacy support of v1.3
-        processList = glob.glob("ConcurrencyView/*_Thread.aadl")
-        g_stageLog.info("Updating thread priorities, stack sizes, and phases using " + os.path.basename(cvAttributesFile) + " as input")
-        mysystem(
-            "TASTE-CV --edit-aadl " +
-            ",".join('"' + x + '"' for x in processList) +
-            " --update-properties " +
-            '"' + cvAttributesFile + '" --show false')
+        # (the threads to edit are only known once buildsupport has run)
+        cvCmd = ("TASTE-CV --edit-aadl THREADS --update-properties " +
+                 '"' + cvAttributesFile + '" --show false')
+        tools.append("TASTE-CV")
     elif cvAttributesFile.endswith("ConcurrencyView_Properties.aadl"):
         # V2.x tools
-        processList = glob.glob("ConcurrencyView/*_Thread.aadl")
-        g_stageLog.info("Updating thread priorities, stack sizes, and phases using " + os.path.basename(cvAttributesFile) + " as input")
-        mysystem(
-            "TASTE --load-concurrency-view ConcurrencyView/process.aadl " +
-            " --update-properties " +
-            '"' + cvAttributesFile + '" --show false')
+        cvCmd = ("TASTE --load-concurrency-view ConcurrencyView/process.aadl " +
+                 " --update-properties " +
+                 '"' + cvAttributesFile + '" --show false')
+        tools.append("TASTE")
+
+    # The output of buildsupport only depends on these - so when none of them changed, it is
+    # either still there, or restored from the cache, without running buildsupport
+    inputs = [i_aadlFile, os.path.basename(depl_aadlFile), dv, components] + ellidissLibs.split()
+    if cvCmd is not None:
+        inputs.append(cvAttributesFile)
+    key = GeneratorKey(cmd + "\n" + str(cvCmd), tools, inputs)
+    run = os.path.abspath(".") + "\0buildsupport"
+    if GeneratorIsUpToDate(run, key):
+        print "No need to reinvoke buildsupport"
+        sys.stdout.flush()
+        return
+    fd, bundle = tempfile.mkstemp(prefix=".tasteGenerator", suffix=".zip")
+    os.close(fd)
+    try:
+        if g_objectCache is not None and g_objectCache.fetch(key, bundle):
+            RememberGeneratorRun(run, key, RestoreBundle(bundle, "."))
+            print "No need to reinvoke buildsupport (using its cached output)"
+            sys.stdout.flush()
+            return
+
+        # Generate in a staging folder, and only move over the files that changed
+        stagingDir = ".buildsupportStaging"
+        if os.path.isdir(stagingDir):
+            shutil.rmtree(stagingDir)
+        os.mkdir(stagingDir)
+        for i in [os.path.basename(depl_aadlFile), dv]:
+            shutil.copy2(i, stagingDir)
+        os.chdir(stagingDir)
+        mysystem(cmd)
+        if cvCmd is not None:
+            processList = glob.glob("ConcurrencyView/*_Thread.aadl")
+            g_stageLog.info("Updating thread priorities, stack sizes, and phases using " + os.path.basename(cvAttributesFile) + " as input")
+            mysystem(cvCmd.replace("THREADS", ",".join('"' + x + '"' for x in processList), 1))
+        for i in [os.path.basename(depl_aadlFile), dv]:
+            os.unlink(i)
+        os.chdir("..")
+        outputs = []
+        for root, _, files in os.walk(stagingDir):
+            outputs.extend(os.path.relpath(root + os.sep + f, stagingDir) for f in files)
+        if g_objectCache is not None:
+            WriteBundle(bundle, stagingDir, outputs)
+            g_objectCache.store(key, bundle)
+        for x in outputs:
+            InstallIfChanged(stagingDir + os.sep + x, x)
+        shutil.rmtree(stagingDir)
+        RememberGeneratorRun(run, key, outputs)
+    finally:
+        os.unlink(bundle)
 
 
 def AdaSpecialHandling(AdaIncludePath, adaSubsystems):
@@ -1976,6 +3648,9 @@ def AdaSpecialHandling(AdaIncludePath, adaSubsystems):
                 mysystem("mv \"%s\" \"%s\"" % (x, baseDir))
         os.chdir("..")
 
+    # The Ada code may have been unzipped in a forked stage - so re-export the path
+    if AdaIncludePath is not None:
+        os.environ["ADA_INCLUDE_PATH"] = AdaIncludePath
     for maybeDir in os.listdir("."):
         if not os.path.isdir(maybeDir):
             continue
@@ -1986,10 +3661,70 @@ def AdaSpecialHandling(AdaIncludePath, adaSubsystems):
             AdaIncludePath += ":" + os.path.abspath("." + os.sep + maybeDir)
         else:
             AdaIncludePath = os.path.abspath("." + os.sep + maybeDir)
-        os.putenv("ADA_INCLUDE_PATH", AdaIncludePath)
+        os.environ["ADA_INCLUDE_PATH"] = AdaIncludePath
     return AdaIncludePath
 
 
+def MakefileProbeKey(makefile):
+    '''Returns a hash of what the CC, CFLAGS and LDFLAGS of a Makefile depend on
+
+    That is, the Makefile itself, the files it includes (as far as they can be
+    found - their paths are expanded with the variables assigned in the Makefiles
+    and with the environment), the environment variables they refer to, and
+    Ocarina (whose runtime provides the Makefiles that the generated ones include).'''
+    key = hashlib.md5()
+    if not os.path.isfile(makefile):
+        return ""
+    ocarina = FindInPath("ocarina")
+    if ocarina is not None:
+        key.update(md5hash(ocarina) + "\n")
+    assigned = {}
+    variables = set(["CC", "CFLAGS", "LDFLAGS", "PATH", "RTEMS_MAKEFILE_PATH"])
+    seen = set()
+
+    def expand(text):
+        # Nested references, e.g. $(RUNTIME_PATH) defined via $(OCARINA_PATH), need a few passes
+        for _ in xrange(10):
+            expanded = re.sub(
+                r'\$[({](\w+)[)}]', lambda m: assigned.get(m.group(1), os.environ.get(m.group(1), "")), text)
+            if expanded == text:
+                break
+            text = expanded
+        return text
+
+    def scan(filename):
+        filename = os.path.abspath(filename)
+        if filename in seen:
+            return
+        seen.add(filename)
+        key.update(filename + md5hash(filename) + "\n")
+        contents = open(filename).read()
+        variables.update(re.findall(r'\$[({](\w+)[)}]', contents))
+        for line in contents.replace("\\\n", " ").splitlines():
+            assignment = re.match(r'^\s*(?:override\s+|export\s+)?(\w+)\s*([:?+]?=)\s*(.*)$', line)
+            if assignment:
+                var, op, value = assignment.groups()
+                if op == "?=":
+                    if var not in assigned and var not in os.environ:
+                        assigned[var] = value
+                elif op == "+=":
+                    assigned[var] = assigned.get(var, os.environ.get(var, "")) + " " + value
+                else:
+                    assigned[var] = expand(value) if op == ":=" else value
+                continue
+            included = re.match(r'^\s*-?include\s+(.*)$', line)
+            if included:
+                for f in expand(included.group(1)).split():
+                    for path in sorted(glob.glob(f)):
+                        if os.path.isfile(path):
+                            scan(path)
+
+    scan(makefile)
+    for var in sorted(variables):
+        key.update("%s=%s\n" % (var, os.environ.get(var, "")))
+    return key.hexdigest()
+
+
 def ParsePartitionInformation():
     '''Parses the 'nodes' output of buildsupport to learn about the system's node(s)'''
     g_stageLog.info("Parsing Partition Information")
@@ -2015,29 +3750,42 @@ def ParsePartitionInformation():
             def getCompilerAndLinkerFlags():
                 # New detection logic for platform-level CC, CFLAGS and LDFLAGS to use
                 # (from ticket 311)
-                makefilename = "/tmp/Makefile" + str(os.getpid())
-                f = open(makefilename, "w")
-                f.write('include GlueAndBuild/deploymentview_final/' + partitionName + '/Makefile\n')
-                f.write('\n')
-                f.write('printCC:\n')
-                f.write('\t@$(info $(CC))\n\n')
-                f.write('printCflags:\n')
-                f.write('\t@$(info $(CFLAGS))\n\n')
-                f.write('printLdflags:\n')
-                f.write('\t@$(info $(LDFLAGS))\n\n')
-                f.close()
+                ocarinaMakefile = 'GlueAndBuild/deploymentview_final/' + partitionName + '/Makefile'
+                probeKey = MakefileProbeKey(ocarinaMakefile)
+                recorded = g_buildState.get("makeProbes", partitionName)
+                if probeKey != "" and recorded is not None and recorded.split("\n")[0] == probeKey:
+                    cc, cf, ld = recorded.split("\n")[1:]
+                else:
+                    # A single make run, reporting all three
+                    makefilename = "/tmp/Makefile" + str(os.getpid())
+                    f = open(makefilename, "w")
+                    f.write('include ' + ocarinaMakefile + '\n')
+                    f.write('\n')
+                    f.write('printFlags:\n')
+                    f.write('\t@$(info TASTE_CC=$(CC))\n')
+                    f.write('\t@$(info TASTE_CFLAGS=$(CFLAGS))\n')
+                    f.write('\t@$(info TASTE_LDFLAGS=$(LDFLAGS))\n\n')
+                    f.close()
+                    probed = {}
+                    for line in os.popen("make -s -f " + makefilename + " printFlags 2>&1").readlines():
+                        for var in ["CC", "CFLAGS", "LDFLAGS"]:
+                            if line.startswith("TASTE_" + var + "="):
+                                probed[var] = line[len("TASTE_" + var + "="):].strip()
+                    os.unlink(makefilename)
+                    cc = probed.get("CC", "")
+                    cf = probed.get("CFLAGS", "")
+                    ld = probed.get("LDFLAGS", "")
+                    if cc.split() != []:
+                        g_buildState.update("makeProbes", {partitionName: "\n".join([probeKey, cc, cf, ld])})
                 try:
-                    cc = getSingleLineFromCmdOutput("make -s -f " + makefilename + " printCC 2>&1").split()[0]
+                    cc = cc.split()[0]
                     if cc == "cc":
                         prefix = ""
                     else:
                         prefix = re.sub(r'gcc$', '', cc)
                 except:
                     panic("Failed to detect a proper compiler for " + partitionName)
-                cf = getSingleLineFromCmdOutput("make -s -f " + makefilename + " printCflags 2>&1")
                 cf = cf.replace("-DRTEMS_PURE", "")
-                ld = getSingleLineFromCmdOutput("make -s -f " + makefilename + " printLdflags 2>&1")
-                os.unlink(makefilename)
                 if partitionNameWithoutSuffix not in g_customCFlagsForUserCodeOnlyPerNode:
                     g_customCFlagsForUserCodeOnlyPerNode.setdefault(partitionNameWithoutSuffix, []).append(cf)
                 if partitionNameWithoutSuffix not in g_customLDFlagsPerNode:
@@ -2083,7 +3831,6 @@ def ParsePartitionInformation():
                 key = envVarAssignment[:idx]
                 value = envVarAssignment[idx + 1:]
                 print(key, '==>', value)
-                os.putenv(key, value)
                 os.environ[key] = value
                 # If we just read RTEMS_MAKEFILE_PATH related settings, the target was
                 # an RTEMS one - so we first set the env up, and THEN call out into the
@@ -2124,7 +3871,7 @@ def DetectGUIsubSystems(AdaIncludePath):
             AdaIncludePath += ":" + os.path.abspath(baseDir)
         else:
             AdaIncludePath = os.path.abspath(baseDir)
-        os.putenv("ADA_INCLUDE_PATH", AdaIncludePath)
+        os.environ["ADA_INCLUDE_PATH"] = AdaIncludePath
     return guiSubsystems, AdaIncludePath
 
 
@@ -2168,7 +3915,7 @@ def CreateAndCompileGlue(
     asn1Grammar, cflagsSoFar,
         scadeIncludes, simulinkIncludes, micropythonIncludes, cIncludes, adaIncludes, rtdsIncludes, guiIncludes, cyclicIncludes,
         scadeSubsystems, simulinkSubsystems, micropythonSubsystems, cSubsystems, cppSubsystems, adaSubsystems, rtdsSubsystems, ogSubsystems, guiSubsystems, cyclicSubsystems, vhdlSubsystems,
-        md5s, md5hashesFilename,
+        md5s, md5namespace,
         majorSimulinkVersion, bUseSimulinkMakefiles):
 
     '''Invokes aadl2glueC to create the glue code, and compiles it'''
@@ -2216,23 +3963,18 @@ def CreateAndCompileGlue(
                 # Patch calls to _step functions, sometimes they have 0 param, sometimes they don't
                 # so look at the header files...
                 mysystem('LINES=`grep "_step.*int_T.*tid" ../../"%s"/"%s"/*h  2>/dev/null | wc -l` ; if [ $LINES -eq 1 ] ; then for i in *.c ; do cat "$i" | sed "s,_step(),_step(0)," > a_temp_name && mv a_temp_name "$i" ; done ; fi ; exit 0' % (baseDir, baseDir))
-                mysystem("\"$GNATGCC\" -c %s -I ../../auto-src %s %s %s %s %s %s %s %s %s *.c" % (
+                CompileSources("\"$GNATGCC\"", "%s -I ../../auto-src %s %s %s %s %s %s %s %s %s" % (
                     cflagsSoFar + CalculateCFLAGS(baseDir, withPOHIC=False) + CalculateUserCodeOnlyCFLAGS(baseDir),
                     bUseSimulinkMakefiles[baseDir][2],
                     scadeIncludes, simulinkIncludes, micropythonIncludes, cIncludes, guiIncludes, adaIncludes, cyclicIncludes, rtdsIncludes))
             else:
-                mysystem("\"$GNATGCC\" -c %s -I ../../auto-src %s %s %s %s %s %s %s %s %s *.c" % (
+                CompileSources("\"$GNATGCC\"", "%s -I ../../auto-src %s %s %s %s %s %s %s %s %s" % (
                     cflagsSoFar + CalculateCFLAGS(baseDir, withPOHIC=False) + CalculateUserCodeOnlyCFLAGS(baseDir),
                     scadeIncludes, simulinkIncludes, micropythonIncludes, cIncludes, guiIncludes, adaIncludes, cyclicIncludes, rtdsIncludes,
                     vhdlIncludes))
             os.chdir("..")
 
-            lock.acquire()
-            md = open(g_absOutputDir + os.sep + md5hashesFilename, 'a')
-            for i in [absDview, absMinicv]:
-                md.write("%s:%s\n" % (i, md5hash(i)))
-            md.close()
-            lock.release()
+            g_buildState.update(md5namespace, dict((i, md5hash(i)) for i in [absDview, absMinicv]))
         else:
             lock.acquire()
             print "No need to rebuild glue for", baseDir
@@ -2245,56 +3987,97 @@ def CreateAndCompileGlue(
                 os.chdir("../../" + baseDir + os.sep + baseDir)
                 CheckDirectives(baseDir)
                 os.chdir(curDir)
-                mysystem("\"$GNATGCC\" -c %s -I ../../auto-src %s %s %s %s %s %s %s %s %s *.c" % (
+                CompileSources("\"$GNATGCC\"", "%s -I ../../auto-src %s %s %s %s %s %s %s %s %s" % (
                     cflagsSoFar + CalculateCFLAGS(baseDir, withPOHIC=False) + CalculateUserCodeOnlyCFLAGS(baseDir),
                     bUseSimulinkMakefiles[baseDir][2],
                     scadeIncludes, simulinkIncludes, micropythonIncludes, cIncludes, guiIncludes, adaIncludes, cyclicIncludes, rtdsIncludes))
             else:
-                mysystem("\"$GNATGCC\" -c %s -I ../../auto-src %s %s %s %s %s %s %s %s %s *.c" % (
+                CompileSources("\"$GNATGCC\"", "%s -I ../../auto-src %s %s %s %s %s %s %s %s %s" % (
                     cflagsSoFar + CalculateCFLAGS(baseDir, withPOHIC=False) + CalculateUserCodeOnlyCFLAGS(baseDir),
                     scadeIncludes, simulinkIncludes, micropythonIncludes, cIncludes, guiIncludes, adaIncludes, cyclicIncludes, rtdsIncludes,
                     vhdlIncludes))
             os.chdir("..")
 
+    # Each function is processed in a job of its own - and as soon as any
+    # of them completes, the next function is dispatched.
     lock = multiprocessing.Lock()
-    listOfAadl2GluecProcesses = []
-
-    # Disable g_bRetry for this part, it runs under multicore
-    global g_bRetry
-    retry = g_bRetry
-    g_bRetry = False
-    runningInstances = 0
-    totalCPUs = DetermineNumberOfCPUs()
-    allSuccessful = True
+    pool = JobPool(kind="aadl2glueC")
     for baseDir in scadeSubsystems.keys() + simulinkSubsystems.keys() + micropythonSubsystems.keys() + cSubsystems.keys() + cppSubsystems.keys() + adaSubsystems.keys() + ogSubsystems.keys() + rtdsSubsystems.keys() + guiSubsystems + cyclicSubsystems + vhdlSubsystems.keys():
-        if runningInstances >= totalCPUs:
-            allAreStillAlive = True
-            while allAreStillAlive:
-                for idx, p in enumerate(listOfAadl2GluecProcesses):
-                    childIsAlive = p.is_alive()
-                    allAreStillAlive = allAreStillAlive and childIsAlive
-                    if not childIsAlive:
-                        allSuccessful = allSuccessful and (listOfAadl2GluecProcesses[idx].exitcode==0)
-                        del listOfAadl2GluecProcesses[idx]
-                        break
-                else:
-                    time.sleep(1)
-            runningInstances -= 1
-        p = multiprocessing.Process(target=InvokeAadl2GlueCandCompile, args=(copy.copy(baseDir), lock))
-        listOfAadl2GluecProcesses.append(p)
-        p.start()
-        runningInstances += 1
-    for p in listOfAadl2GluecProcesses:
-        p.join()
-        if p.exitcode != 0:
-            allSuccessful = False
-    g_bRetry = retry
-    if not allSuccessful:
-        panic("aadl2glueC invocation failed...")
+        pool.submit(baseDir, InvokeAadl2GlueCandCompile, baseDir, lock)
+    failed = []
+    while pool.busy():
+        outcome = pool.waitOne()
+        if not outcome.success:
+            failed.append(outcome.key)
+        cpuTime = ""
+        if outcome.rusage is not None:
+            cpuTime = ", %.1fs CPU" % (outcome.rusage.ru_utime + outcome.rusage.ru_stime)
+        lock.acquire()
+        print "Glue for %s: %s (%.1fs%s)" % (
+            outcome.key, "done" if outcome.success else "FAILED", outcome.wallTime, cpuTime)
+        sys.stdout.flush()
+        lock.release()
+    if failed:
+        panic("aadl2glueC invocation failed for:\n\t" + "\n\t".join(failed))
     os.chdir("..")
 
 
-def InvokeOcarina(i_aadlFile, depl_aadlFile, md5s, md5hashesFilename, wrappers):
+def TreeDigest(folder):
+    '''Returns a hash of the names and contents of all the files under the folder'''
+    digest = hashlib.md5()
+    for root, dirs, files in os.walk(folder):
+        dirs.sort()
+        for name in sorted(files):
+            path = root + os.sep + name
+            digest.update(os.path.relpath(path, folder) + "\0")
+            f = open(path, 'rb')
+            for chunk in iter(lambda: f.read(1 << 20), ''):
+                digest.update(chunk)
+            f.close()
+    return digest.hexdigest()
+
+
+def SwapInOcarinaOutput(stagingDir):
+    '''Moves the code that Ocarina generated in the staging folder into the current one (GlueAndBuild)
+
+    The generated code is compared per node folder (e.g. deploymentview_final/mypartition_obj1)
+    with what was generated in the last build: unchanged node folders are left as they are -
+    along with anything built inside them. Everything else that is not glue is replaced.'''
+    generated = [x for x in os.listdir(stagingDir) if os.path.isdir(stagingDir + os.sep + x)]
+    for x in os.listdir("."):
+        if os.path.isdir(x) and not x.lower().startswith("glue") and x not in generated and x != stagingDir:
+            shutil.rmtree(x)
+    for d in generated:
+        mkdirIfMissing(d)
+        staged = os.listdir(stagingDir + os.sep + d)
+        for x in os.listdir(d):
+            if x not in staged:
+                if os.path.isdir(d + os.sep + x):
+                    shutil.rmtree(d + os.sep + x)
+                else:
+                    os.unlink(d + os.sep + x)
+        for x in staged:
+            src = stagingDir + os.sep + d + os.sep + x
+            dst = d + os.sep + x
+            if os.path.isdir(src):
+                digest = TreeDigest(src)
+                if os.path.isdir(dst) and g_buildState.get("ocarinaOutput", os.path.abspath(dst)) == digest:
+                    print "No changes in the Ocarina-generated code of", x
+                    sys.stdout.flush()
+                    continue
+                if os.path.isdir(dst):
+                    shutil.rmtree(dst)
+                elif os.path.exists(dst):
+                    os.unlink(dst)
+                os.rename(src, dst)
+                g_buildState.update("ocarinaOutput", {os.path.abspath(dst): digest})
+            elif not os.path.isfile(dst) or not filecmp.cmp(src, dst, shallow=False):
+                if os.path.isdir(dst):
+                    shutil.rmtree(dst)
+                os.rename(src, dst)
+
+
+def InvokeOcarina(i_aadlFile, depl_aadlFile, md5s, md5namespace, wrappers):
     '''Invokes the Ocarina code generation tool'''
     g_stageLog.info("Invoking Ocarina")
     mkdirIfMissing("GlueAndBuild")
@@ -2326,7 +4109,7 @@ def InvokeOcarina(i_aadlFile, depl_aadlFile, md5s, md5hashesFilename, wrappers):
         shutil.copy("../ConcurrencyView/" + i, ".")
 
     shutil.copy(i_aadlFile, ".")
-    installPath = getSingleLineFromCmdOutput("taste-config --prefix")
+    installPath = QueryTool("taste-config", "--prefix")
     ellidissPrefix = '{inst}/share/config_ellidiss/'.format(inst=installPath)
     for i in ('TASTE_IV_Properties.aadl', 'TASTE_DV_Properties.aadl'):
         shutil.copy(ellidissPrefix + i, '.')
@@ -2389,12 +4172,20 @@ end ASSERT_System.Impl;
     mysystem('cleanupDV.pl "%s" > a_temp_name && mv a_temp_name "%s"' % (os.path.basename(depl_aadlFile), os.path.basename(depl_aadlFile)))
     if invokeOcarina:
         # banner("Invoking ocarina")
-        mysystem("find . -type d \( -iname 'glue*' -prune -o -exec rm -rf '{}' ';' \) 2>/dev/null || exit 0")
+        # Generate in a staging folder, and only replace the nodes whose code changed
+        stagingDir = ".ocarinaStaging"
+        if os.path.isdir(stagingDir):
+            shutil.rmtree(stagingDir)
+        os.mkdir(stagingDir)
+        for i in os.listdir("."):
+            if os.path.isfile(i):
+                shutil.copy2(i, stagingDir)
+        os.chdir(stagingDir)
         mysystem("ocarina -x main.aadl")
-        md = open(g_absOutputDir + os.sep + md5hashesFilename, 'a')
-        for i in aadlSources:
-            md.write("%s:%s\n" % (i, md5hash(i)))
-        md.close()
+        os.chdir("..")
+        SwapInOcarinaOutput(stagingDir)
+        shutil.rmtree(stagingDir)
+        g_buildState.update(md5namespace, dict((i, md5hash(i)) for i in aadlSources))
     else:
         print "No need to reinvoke ocarina"
         sys.stdout.flush()
@@ -2500,7 +4291,9 @@ def main():
         cppSubsystems, adaSubsystems, rtdsSubsystems, ogSubsystems, vhdlSubsystems, \
         timerResolution = cmdLineInformation
 
-    os.putenv("WORKDIR", os.path.abspath(outputDir))
+    os.environ["WORKDIR"] = os.path.abspath(outputDir)
+    StartJobServer(g_maxJobs)
+    StartTrace(g_absOutputDir)
 
     i_aadlFile = os.path.abspath(i_aadlFile)  # use absolute paths to the two views
     depl_aadlFile = os.path.abspath(depl_aadlFile)
@@ -2527,10 +4320,12 @@ def main():
     os.chdir(outputDir)
 
     # Read any pre-existing MD5 signatures
-    md5s, md5hashesFilename = ReadMD5sums(bDebug)
+    OpenBuildState()
+    md5s, md5namespace = ReadMD5sums(bDebug)
 
-    # Create the AADL DataViews from the ASN.1 grammars referenced in the IF view
-    acnFile, isNewGrammar = CreateDataViews(i_aadlFile, asn1Grammar, acnFile, baseASN, md5s, md5hashesFilename)
+    # ...and the memory that the build jobs needed in the previous runs
+    StartMemoryAccounting()
+    StartObjectCache()
 
     # Update global compilation flags (non-partition-specific)
     if bUseEmptyInitializers:
@@ -2547,83 +4342,136 @@ def main():
     if bDebug:
         cflagsSoFar += "-g"
 
-    InvokeASN1Compiler(asn1Grammar, baseASN, acnFile, baseACN, isNewGrammar, bCoverage)
-
-    UnzipSCADEcode(scadeSubsystems)
-    majorSimulinkVersion, bUseSimulinkMakefiles = UnzipSimulinkCode(simulinkSubsystems)
-    UnzipMicroPythonCode(micropythonSubsystems)
-    UnzipCcode(cSubsystems, 'C')
-    UnzipCcode(cppSubsystems, 'C++')
-    AdaIncludePath = UnzipAdaCode(adaSubsystems, AdaIncludePath)
-    uniqueSetOfAdaPackages = DetectAdaPackages(adaSubsystems, asn1Grammar)
-    UnzipRTDS(rtdsSubsystems)
-
-    InvokeBuildSupport(i_aadlFile, depl_aadlFile, bKeepCase, bDebug, cvAttributesFile, timerResolution)
-
-    wrappers = FindWrappers()
-    InvokeOcarina(i_aadlFile, depl_aadlFile, md5s, md5hashesFilename, wrappers)
-
-    AdaIncludePath = AdaSpecialHandling(AdaIncludePath, adaSubsystems)
-    ParsePartitionInformation()
-    cflagsSoFar += " " + os.getenv('CFLAGS', default="") + " "
-    guiSubsystems, AdaIncludePath = DetectGUIsubSystems(AdaIncludePath)
-    cyclicSubsystems = DetectCyclicSubsystems()
-
-    InvokeObjectGeodeGenerator(ogSubsystems)
-
-    scadeIncludes, simulinkIncludes, micropythonIncludes, cIncludes, rtdsIncludes, guiIncludes, adaIncludes, cyclicIncludes, AdaIncludePath = \
-        CreateIncludePaths(
-            scadeSubsystems, simulinkSubsystems, micropythonSubsystems, qgencSubsystems, cSubsystems, cppSubsystems, qgenadaSubsystems,
-            adaSubsystems, rtdsSubsystems, guiSubsystems, cyclicSubsystems, AdaIncludePath)
-
-    CreateAndCompileGlue(
-        asn1Grammar,
-        cflagsSoFar,
-        scadeIncludes, simulinkIncludes, micropythonIncludes, cIncludes, adaIncludes, rtdsIncludes, guiIncludes, cyclicIncludes,
-        scadeSubsystems, simulinkSubsystems, micropythonSubsystems, cSubsystems, cppSubsystems, adaSubsystems, rtdsSubsystems, ogSubsystems, guiSubsystems, cyclicSubsystems, vhdlSubsystems,
-        md5s, md5hashesFilename,
-        majorSimulinkVersion, bUseSimulinkMakefiles)
-
-    pythonSubsystems = DetectPythonSubsystems()
-
-    BuildSCADEsystems(scadeSubsystems, CDirectories, cflagsSoFar)
-    BuildSimulinkSystems(simulinkSubsystems, CDirectories, cflagsSoFar, bUseSimulinkMakefiles)
-    BuildMicroPythonSystems(micropythonSubsystems, CDirectories, cflagsSoFar)
-    BuildCsystems(cSubsystems, CDirectories, cflagsSoFar)
-    BuildCPPsystems(cppSubsystems, CDirectories, cflagsSoFar)
-    BuildAdaSystems_C_code(adaSubsystems, CDirectories, uniqueSetOfAdaPackages, cflagsSoFar)
-    BuildObjectGeodeSystems(ogSubsystems, CDirectories, cflagsSoFar)
-    BuildRTDSsystems(rtdsSubsystems, CDirectories, cflagsSoFar)
-    BuildVHDLsystems_C_code(vhdlSubsystems, CDirectories, cflagsSoFar)
-
-    BuildGUIs(guiSubsystems, cflagsSoFar, asn1Grammar)
-
-    BuildPythonStubs(pythonSubsystems, asn1Grammar, acnFile)
-
-    shutil.rmtree(tmpDirName)
-
-    BuildCyclicSubsystems(cyclicSubsystems, cflagsSoFar)
-
-    RenameCommonlyNamedSymbols(
-        scadeSubsystems,
-        simulinkSubsystems,
-        micropythonSubsystems,
-        cSubsystems,
-        cppSubsystems,
-        adaSubsystems,
-        rtdsSubsystems,
-        ogSubsystems,
-        guiSubsystems,
-        cyclicSubsystems,
-        vhdlSubsystems)
-
-    AdaIncludePath = InvokeOcarinaMakefiles(
-        scadeSubsystems, simulinkSubsystems, micropythonSubsystems, cSubsystems, cppSubsystems, adaSubsystems, rtdsSubsystems, ogSubsystems, guiSubsystems, cyclicSubsystems, vhdlSubsystems,
-        cflagsSoFar, CDirectories, AdaDirectories, AdaIncludePath, ExtraLibraries,
-        bDebug, bUseEmptyInitializers, bCoverage, bProfiling)
-
-    GatherAllExecutableOutput(outputDir, pythonSubsystems, vhdlSubsystems, tmpDirName, bDebug, i_aadlFile)
-    CopyDatabaseFolderIfExisting()
+    def parsePartitions(unused_artifacts):
+        ParsePartitionInformation()
+        # The 'envvars' of the partitions may have set CFLAGS
+        return cflagsSoFar + " " + os.getenv('CFLAGS', default="") + " "
+
+    def createAndCompileGlue(a):
+        CreateAndCompileGlue(
+            asn1Grammar,
+            a['cflags'],
+            a['scadeIncludes'], a['simulinkIncludes'], a['micropythonIncludes'], a['cIncludes'], a['adaIncludes'], a['rtdsIncludes'], a['guiIncludes'], a['cyclicIncludes'],
+            scadeSubsystems, simulinkSubsystems, micropythonSubsystems, cSubsystems, cppSubsystems, adaSubsystems, rtdsSubsystems, ogSubsystems, a['guiSubsystems'], a['cyclicSubsystems'], vhdlSubsystems,
+            md5s, md5namespace,
+            a['majorSimulinkVersion'], a['bUseSimulinkMakefiles'])
+
+    def buildAndLink(a):
+        cflags = a['cflags']
+        guiSubsystems = a['guiSubsystems']
+        cyclicSubsystems = a['cyclicSubsystems']
+        pythonSubsystems = a['pythonSubsystems']
+
+        # All functions (of all languages) are compiled in parallel
+        pool = JobPool(kind="build")
+        BuildSCADEsystems(scadeSubsystems, CDirectories, cflags, pool)
+        BuildSimulinkSystems(simulinkSubsystems, CDirectories, cflags, a['bUseSimulinkMakefiles'], pool)
+        BuildMicroPythonSystems(micropythonSubsystems, CDirectories, cflags, pool)
+        BuildCsystems(cSubsystems, CDirectories, cflags, pool)
+        BuildCPPsystems(cppSubsystems, CDirectories, cflags, pool)
+        BuildAdaSystems_C_code(adaSubsystems, CDirectories, a['uniqueSetOfAdaPackages'], cflags, pool)
+        BuildObjectGeodeSystems(ogSubsystems, CDirectories, cflags, pool)
+        BuildRTDSsystems(rtdsSubsystems, CDirectories, cflags, pool)
+        BuildVHDLsystems_C_code(vhdlSubsystems, CDirectories, cflags, pool)
+
+        BuildGUIs(guiSubsystems, cflags, asn1Grammar, pool)
+
+        BuildPythonStubs(pythonSubsystems, asn1Grammar, a['acnFile'], pool)
+
+        BuildCyclicSubsystems(cyclicSubsystems, cflags, pool)
+
+        failed = pool.waitAll()
+        if failed:
+            panic("Failed to build:\n\t" + "\n\t".join(failed))
+
+        shutil.rmtree(tmpDirName)
+
+        RenameCommonlyNamedSymbols(
+            scadeSubsystems,
+            simulinkSubsystems,
+            micropythonSubsystems,
+            cSubsystems,
+            cppSubsystems,
+            adaSubsystems,
+            rtdsSubsystems,
+            ogSubsystems,
+            guiSubsystems,
+            cyclicSubsystems,
+            vhdlSubsystems)
+
+        InvokeOcarinaMakefiles(
+            scadeSubsystems, simulinkSubsystems, micropythonSubsystems, cSubsystems, cppSubsystems, adaSubsystems, rtdsSubsystems, ogSubsystems, guiSubsystems, cyclicSubsystems, vhdlSubsystems,
+            cflags, CDirectories, AdaDirectories, a['AdaIncludePath'], ExtraLibraries,
+            bDebug, bUseEmptyInitializers, bCoverage, bProfiling)
+
+        GatherAllExecutableOutput(outputDir, pythonSubsystems, vhdlSubsystems, tmpDirName, bDebug, i_aadlFile)
+        CopyDatabaseFolderIfExisting()
+
+    # The build stages, listed in a valid serial order. Each one declares what
+    # it needs and what it produces, so independent stages can run concurrently.
+    unzippedCode = ["scadeCode", "majorSimulinkVersion", "bUseSimulinkMakefiles", "micropythonCode",
+                    "cCode", "cppCode", "unzippedAdaIncludePath", "rtdsCode"]
+    includes = ["scadeIncludes", "simulinkIncludes", "micropythonIncludes", "cIncludes",
+                "rtdsIncludes", "guiIncludes", "adaIncludes", "cyclicIncludes"]
+    stages = [
+        # Create the AADL DataViews from the ASN.1 grammars referenced in the IF view
+        Stage("CreateDataViews",
+              lambda a: CreateDataViews(i_aadlFile, asn1Grammar, acnFile, baseASN, md5s, md5namespace),
+              outputs=["acnFile", "isNewGrammar", "dataViews"]),
+        Stage("InvokeASN1Compiler",
+              lambda a: InvokeASN1Compiler(asn1Grammar, baseASN, a['acnFile'], baseACN, a['isNewGrammar'], bCoverage),
+              inputs=["acnFile", "isNewGrammar"], outputs=["auto-src"]),
+        Stage("UnzipSCADEcode", lambda a: UnzipSCADEcode(scadeSubsystems), outputs=["scadeCode"]),
+        Stage("UnzipSimulinkCode", lambda a: UnzipSimulinkCode(simulinkSubsystems),
+              outputs=["majorSimulinkVersion", "bUseSimulinkMakefiles"]),
+        Stage("UnzipMicroPythonCode", lambda a: UnzipMicroPythonCode(micropythonSubsystems), outputs=["micropythonCode"]),
+        Stage("UnzipCcode", lambda a: UnzipCcode(cSubsystems, 'C'), outputs=["cCode"]),
+        Stage("UnzipCPPcode", lambda a: UnzipCcode(cppSubsystems, 'C++'), outputs=["cppCode"]),
+        Stage("UnzipAdaCode", lambda a: UnzipAdaCode(adaSubsystems, AdaIncludePath), outputs=["unzippedAdaIncludePath"]),
+        Stage("DetectAdaPackages", lambda a: DetectAdaPackages(adaSubsystems, asn1Grammar),
+              inputs=["dataViews"], outputs=["uniqueSetOfAdaPackages"]),
+        Stage("UnzipRTDS", lambda a: UnzipRTDS(rtdsSubsystems), outputs=["rtdsCode"]),
+        Stage("InvokeBuildSupport",
+              lambda a: InvokeBuildSupport(i_aadlFile, depl_aadlFile, bKeepCase, bDebug, cvAttributesFile, timerResolution),
+              inputs=["dataViews"], outputs=["buildSupport"]),
+        # The wrappers are also searched for inside the unzipped user code
+        Stage("FindWrappers", lambda a: FindWrappers(),
+              inputs=["buildSupport"] + unzippedCode, outputs=["wrappers"], bForked=False),
+        Stage("InvokeOcarina", lambda a: InvokeOcarina(i_aadlFile, depl_aadlFile, md5s, md5namespace, a['wrappers']),
+              inputs=["wrappers"], outputs=["ocarina"]),
+        # This moves the Ada wrappers around, so Ocarina must have copied them first
+        Stage("AdaSpecialHandling", lambda a: AdaSpecialHandling(a['unzippedAdaIncludePath'], adaSubsystems),
+              inputs=["unzippedAdaIncludePath", "ocarina"], outputs=["specialAdaIncludePath"], bForked=False),
+        Stage("ParsePartitionInformation", parsePartitions, inputs=["ocarina"], outputs=["cflags"], bForked=False),
+        Stage("DetectGUIsubSystems", lambda a: DetectGUIsubSystems(a['specialAdaIncludePath']),
+              inputs=["specialAdaIncludePath"], outputs=["guiSubsystems", "guiAdaIncludePath"], bForked=False),
+        Stage("DetectCyclicSubsystems", lambda a: DetectCyclicSubsystems(),
+              inputs=["buildSupport"], outputs=["cyclicSubsystems"], bForked=False),
+        Stage("InvokeObjectGeodeGenerator", lambda a: InvokeObjectGeodeGenerator(ogSubsystems),
+              inputs=["buildSupport"], outputs=["ogCode"]),
+        Stage("CreateIncludePaths",
+              lambda a: CreateIncludePaths(
+                  scadeSubsystems, simulinkSubsystems, micropythonSubsystems, qgencSubsystems, cSubsystems, cppSubsystems, qgenadaSubsystems,
+                  adaSubsystems, rtdsSubsystems, a['guiSubsystems'], a['cyclicSubsystems'], a['guiAdaIncludePath']),
+              inputs=["guiSubsystems", "cyclicSubsystems", "guiAdaIncludePath"] + unzippedCode,
+              outputs=includes + ["AdaIncludePath"], bForked=False),
+        Stage("CreateAndCompileGlue", createAndCompileGlue,
+              inputs=includes + ["cflags", "auto-src", "ogCode", "guiSubsystems", "cyclicSubsystems",
+                                 "majorSimulinkVersion", "bUseSimulinkMakefiles"],
+              outputs=["glue"], bForked=False),
+        Stage("DetectPythonSubsystems", lambda a: DetectPythonSubsystems(),
+              inputs=["glue"], outputs=["pythonSubsystems"], bForked=False),
+        Stage("BuildAndLink", buildAndLink,
+              inputs=["pythonSubsystems", "uniqueSetOfAdaPackages", "AdaIncludePath", "acnFile"],
+              outputs=["binaries"], bForked=False),
+    ]
+    RunStages(stages)
+
+    if g_objectCache is not None:
+        g_objectCache.report("Object cache")
+        g_objectCache.trim()
+    g_buildState.compact()
+    FinishTrace()
 
 
 if __name__ == "__main__":